@@ -9,6 +9,8 @@ import requests
 from datetime import datetime
 from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
+import sandbox_auth
+from sandbox_client import sandbox_client, SandboxUnavailableError
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -21,34 +23,8 @@ class BankAccountVerifier:
         self.api_version = "1.0"
         
     def _get_auth_token(self) -> Optional[str]:
-        """Get authentication token from Sandbox API"""
-        try:
-            headers = {
-                "accept": "application/json",
-                "x-api-key": self.api_key,
-                "x-api-secret": self.api_secret,
-                "x-api-version": self.api_version,
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/authenticate", 
-                headers=headers, 
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            # Extract the access_token from the response
-            access_token = data.get("data", {}).get("access_token")
-            if access_token:
-                return access_token
-            
-            logger.error(f"No access token in response: {data}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Authentication failed: {e}")
-            return None
+        """Get authentication token from the shared Sandbox token cache"""
+        return sandbox_auth.get_access_token(self.api_key, self.api_secret)
     
     def verify_bank_account(self, account_number: str, ifsc_code: str, 
                           account_holder_name: str = None) -> Dict:
@@ -83,7 +59,7 @@ class BankAccountVerifier:
             bank_code = ifsc_code[:4]
             
             # Construct the URL as per the API documentation
-            url = f"{self.base_url}/bank/{ifsc_code}/accounts/{account_number}/penniless-verify"
+            path = f"/bank/{ifsc_code}/accounts/{account_number}/penniless-verify"
             
             headers = {
                 "accept": "application/json",
@@ -93,9 +69,9 @@ class BankAccountVerifier:
                 "x-api-version": self.api_version
             }
             
-            logger.info(f"Making request to: {url}")
+            logger.info(f"Making request to: {path}")
             
-            response = requests.get(url, headers=headers, timeout=30)
+            response = sandbox_client.get('bank_verify', path, headers=headers)
             
             logger.info(f"Response status: {response.status_code}")
             logger.info(f"Response text: {response.text}")
@@ -147,6 +123,7 @@ class BankAccountVerifier:
                     "status": "ACCOUNT_NOT_FOUND"
                 }
             elif response.status_code == 401:
+                sandbox_auth.token_provider.invalidate(self.api_key, self.api_secret)
                 return {
                     "success": False,
                     "error": "Authentication failed - check API credentials",
@@ -160,6 +137,12 @@ class BankAccountVerifier:
                     "status": "API_ERROR"
                 }
                 
+        except SandboxUnavailableError:
+            return {
+                "success": False,
+                "error": "Bank verification temporarily unavailable",
+                "status": "UNAVAILABLE"
+            }
         except requests.exceptions.Timeout:
             return {
                 "success": False,
@@ -218,9 +201,9 @@ class BankAccountVerifier:
             }
             
             # Use the IFSC lookup endpoint
-            url = f"{self.base_url}/ifsc/{ifsc_code}"
+            path = f"/ifsc/{ifsc_code}"
             
-            response = requests.get(url, headers=headers, timeout=15)
+            response = sandbox_client.get('ifsc', path, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -250,6 +233,11 @@ class BankAccountVerifier:
                     "error": "Invalid IFSC code or API error"
                 }
                 
+        except SandboxUnavailableError:
+            return {
+                "success": False,
+                "error": "IFSC verification temporarily unavailable"
+            }
         except Exception as e:
             logger.error(f"IFSC verification failed: {e}")
             return {
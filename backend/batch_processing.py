@@ -0,0 +1,266 @@
+"""
+Batch invoice processing
+Expands ZIP archives and multi-file uploads into PDF documents and runs them
+through the invoice pipeline on a bounded thread pool, with PDF text and
+field parsing offloaded to a shared process pool, yielding results as they complete
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import upload_spool
+from invoice_context import InvoiceContext
+from upload_spool import InvalidUploadError, SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", str(500 * 1024 * 1024)))
+PARSE_PROCESSES = int(os.getenv("BATCH_PARSE_PROCESSES", "0")) or os.cpu_count() or 1
+
+
+class _ParsePool(Executor):
+    """
+    Process pool shared by all batches, started on first use; a worker that dies
+    (e.g. OOM on a huge PDF) breaks the pool, which is then replaced on the next submit
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the app process runs many threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"Started batch parse pool with {self.max_workers} processes")
+            return self._pool
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        pool = self._current()
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            logger.warning("Batch parse pool is broken, starting a new one")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return self._current().submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+_parse_pool = _ParsePool(PARSE_PROCESSES)
+
+
+def get_parse_pool() -> Executor:
+    """Process pool shared by all batches"""
+    return _parse_pool
+
+
+class BatchDocument:
+    def __init__(self, name: str, load: Callable[[], SpooledUpload], source=None):
+        """
+        Args:
+            name: File name (archive member path for ZIP entries)
+            load: Returns the spooled document; called on the worker thread
+            source: What the document is read from (its spool, or the ZIP archive
+                it's a member of), closed by close_batch_documents
+        """
+        self.name = name
+        self.load = load
+        self.source = source
+
+
+class _ZipArchive:
+    """A spooled ZIP upload opened for reading members; close() releases the handle and the spool"""
+
+    def __init__(self, spool: SpooledUpload):
+        self.spool = spool
+        self.lock = threading.Lock()
+        self._handle = spool.open()
+        try:
+            self.archive = zipfile.ZipFile(self._handle)
+        except Exception:
+            self._handle.close()
+            raise
+
+    def close(self):
+        with self.lock:
+            self.archive.close()
+            self._handle.close()
+        self.spool.close()
+
+
+def close_batch_documents(documents: List[BatchDocument]):
+    """Close the spools and archives behind a batch's documents"""
+    closed = set()
+    for document in documents:
+        if document.source is not None and id(document.source) not in closed:
+            closed.add(id(document.source))
+            try:
+                document.source.close()
+            except Exception as e:
+                logger.warning(f"Error closing batch upload for {document.name}: {e}")
+
+
+def _zip_documents(filename: str, spool: SpooledUpload) -> Tuple[List[BatchDocument], List[Dict], Optional[str]]:
+    try:
+        source = _ZipArchive(spool)
+    except zipfile.BadZipFile:
+        spool.close()
+        return [], [], f"{filename} is not a valid ZIP archive"
+    archive = source.archive
+
+    documents, skipped = [], []
+    declared_total = 0
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+            continue
+        if not name.lower().endswith('.pdf'):
+            skipped.append({'file': name, 'success': False, 'error': 'Only PDF files are processed'})
+            continue
+        if info.file_size > MAX_FILE_BYTES:
+            skipped.append({'file': name, 'success': False, 'error': f"File exceeds {MAX_FILE_BYTES} bytes"})
+            continue
+        declared_total += info.file_size
+        if declared_total > MAX_TOTAL_BYTES:
+            source.close()
+            return [], [], f"{filename} expands beyond {MAX_TOTAL_BYTES} bytes"
+
+        def load(info=info):
+            # Members share the archive's file handle; the size check is repeated
+            # on the actual bytes since declared sizes can't be trusted
+            with source.lock, archive.open(info) as member:
+                return upload_spool.spool_stream(member, info.filename, max_bytes=MAX_FILE_BYTES)
+
+        documents.append(BatchDocument(name, load, source))
+
+    if not documents:
+        source.close()
+    return documents, skipped, None
+
+
+def collect_batch_documents(uploads: List) -> Tuple[List[BatchDocument], List[Dict], Optional[str]]:
+    """
+    Turn uploaded files (PDFs and ZIPs of PDFs) into batch documents
+    Returns (documents, skipped file results, error)
+    """
+    documents, skipped = [], []
+    budget = MAX_TOTAL_BYTES
+    for upload in uploads:
+        filename = upload.filename or ''
+        lower = filename.lower()
+        if not lower.endswith(('.zip', '.pdf')):
+            if filename:
+                skipped.append({'file': filename, 'success': False, 'error': 'Only PDF and ZIP files are allowed'})
+            continue
+
+        if lower.endswith('.zip'):
+            try:
+                spool = upload_spool.spool_stream(upload.stream, filename, max_bytes=budget, require_pdf=False)
+            except InvalidUploadError as e:
+                close_batch_documents(documents)
+                return [], [], str(e)
+            budget -= spool.size
+            zip_documents, zip_skipped, error = _zip_documents(filename, spool)
+            if error:
+                close_batch_documents(documents)
+                return [], [], error
+            documents.extend(zip_documents)
+            skipped.extend(zip_skipped)
+        else:
+            try:
+                spool = upload_spool.spool_stream(upload.stream, filename, max_bytes=min(MAX_FILE_BYTES, budget))
+            except InvalidUploadError as e:
+                skipped.append({'file': filename, 'success': False, 'error': str(e)})
+                continue
+            budget -= spool.size
+            documents.append(BatchDocument(filename, lambda spool=spool: spool, spool))
+
+    if not documents and not skipped:
+        return [], [], "No files provided"
+    if len(documents) > MAX_FILES:
+        close_batch_documents(documents)
+        return [], [], f"Too many files ({len(documents)}); the limit is {MAX_FILES} per batch"
+    return documents, skipped, None
+
+
+def _process_one(document: BatchDocument, process_fn: Callable, format_fn: Callable,
+                 cpu_executor: Optional[Executor]) -> Dict:
+    context = InvoiceContext(cpu_executor=cpu_executor)
+    with document.load() as pdf:
+        result = process_fn(pdf, context)
+    return {'file': document.name, 'success': True, 'data': format_fn(result)['data']}
+
+
+def process_batch_iter(documents: List[BatchDocument], process_fn: Callable, format_fn: Callable,
+                       concurrency: int = None, use_process_pool: bool = True) -> Iterator[Dict]:
+    """
+    Process documents concurrently and yield one result per document as it completes
+
+    process_fn(pdf, context) is the invoice pipeline and format_fn turns its
+    result into the API response body; a failed document yields an error result
+    without stopping the batch
+    """
+    if not documents:
+        return
+    concurrency = max(1, min(concurrency or DEFAULT_CONCURRENCY, MAX_CONCURRENCY))
+    cpu_executor = get_parse_pool() if use_process_pool else None
+
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(documents)), thread_name_prefix="invoice-batch")
+    try:
+        futures = {
+            executor.submit(_process_one, document, process_fn, format_fn, cpu_executor): document
+            for document in documents
+        }
+        for future in as_completed(futures):
+            document = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.error(f"Batch processing failed for {document.name}: {e}")
+                yield {'file': document.name, 'success': False, 'error': str(e)}
+    finally:
+        # Stop queued documents if the client goes away mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize(results: List[Dict]) -> Dict:
+    succeeded = [r for r in results if r.get('success')]
+    risk_levels = Counter(r['data'].get('risk_level') for r in succeeded)
+    return {
+        'total': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'risk_levels': dict(risk_levels),
+        'total_amount': round(sum(_amount(r['data'].get('amount')) for r in succeeded), 2),
+    }
+
+
+def _amount(formatted: str) -> float:
+    try:
+        return float(str(formatted).replace('₹', '').replace(',', '').strip() or 0)
+    except ValueError:
+        return 0.0
@@ -0,0 +1,127 @@
+"""
+Extraction benchmark over OCR text fixtures
+Runs extraction_engine.parse_invoice_text (no S3, Textract or Sandbox calls)
+on every fixture and reports per-field accuracy, throughput and latency
+
+Usage:
+    python benchmarks/extraction_benchmark.py [--fixtures DIR] [--iterations N]
+                                              [--min-accuracy 0.9] [--json]
+
+Each fixture is a JSON file with "text" (anonymized OCR output) and
+"expected" (the correct invoice fields)
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction_engine import parse_invoice_text  # noqa: E402
+
+FIELDS = ['invoice_number', 'invoice_date', 'total_amount', 'vendor_name', 'vendor_gstin']
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixtures(directory: str) -> List[Dict]:
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        fixture['name'] = os.path.splitext(os.path.basename(path))[0]
+        fixtures.append(fixture)
+    return fixtures
+
+
+def field_matches(field: str, actual: str, expected: str) -> bool:
+    if field == 'total_amount':
+        try:
+            return float(actual) == float(expected)
+        except ValueError:
+            return actual == expected
+    return (actual or '').strip().upper() == (expected or '').strip().upper()
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(fixtures: List[Dict], iterations: int) -> Dict:
+    correct = {field: 0 for field in FIELDS}
+    mismatches = []
+
+    for fixture in fixtures:
+        fields = parse_invoice_text(fixture['text'])
+        for field in FIELDS:
+            expected = fixture['expected'].get(field, '')
+            if field_matches(field, fields[field], expected):
+                correct[field] += 1
+            else:
+                mismatches.append({'fixture': fixture['name'], 'field': field,
+                                   'expected': expected, 'actual': fields[field]})
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for fixture in fixtures:
+            t0 = time.perf_counter()
+            parse_invoice_text(fixture['text'])
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    total = len(fixtures)
+    return {
+        'fixtures': total,
+        'accuracy': {field: round(correct[field] / total, 4) for field in FIELDS},
+        'overall_accuracy': round(sum(correct.values()) / (total * len(FIELDS)), 4),
+        'docs_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mismatches': mismatches,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark invoice field extraction on OCR text fixtures")
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help="Directory of fixture JSON files")
+    parser.add_argument('--iterations', type=int, default=200, help="Timed passes over the corpus")
+    parser.add_argument('--min-accuracy', type=float, default=None,
+                        help="Exit non-zero when overall accuracy is below this fraction")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No fixtures found in {args.fixtures}")
+        return 1
+
+    report = run(fixtures, args.iterations)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Fixtures: {report['fixtures']}  ({args.iterations} timed passes)")
+        for field in FIELDS:
+            print(f"  {field:<16} {report['accuracy'][field]:.1%}")
+        print(f"  {'overall':<16} {report['overall_accuracy']:.1%}")
+        print(f"Throughput: {report['docs_per_second']} docs/sec  "
+              f"p50 {report['p50_ms']} ms  p99 {report['p99_ms']} ms")
+        for miss in report['mismatches']:
+            print(f"  MISMATCH {miss['fixture']}.{miss['field']}: "
+                  f"expected {miss['expected']!r}, got {miss['actual']!r}")
+
+    if args.min_accuracy is not None and report['overall_accuracy'] < args.min_accuracy:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
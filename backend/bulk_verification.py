@@ -0,0 +1,147 @@
+"""
+Bulk GSTIN verification
+Fans verify_gstin_and_get_details (and optionally get_return_history) out
+over a bounded thread pool and yields results as they complete
+"""
+
+import csv
+import io
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import gstin_utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("BULK_VERIFY_CONCURRENCY", "8"))
+MAX_CONCURRENCY = int(os.getenv("BULK_VERIFY_MAX_CONCURRENCY", "32"))
+MAX_GSTINS = int(os.getenv("BULK_VERIFY_MAX_GSTINS", "1000"))
+
+
+def parse_gstin_csv(text: str) -> List[str]:
+    """
+    Read GSTINs from CSV text: the 'gstin' column when there is a header,
+    otherwise the first column
+    """
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    if 'gstin' in header:
+        column = header.index('gstin')
+        rows = rows[1:]
+    else:
+        column = 0
+
+    return [row[column] for row in rows if len(row) > column]
+
+
+def dedupe_gstins(values: Iterable[str]) -> List[str]:
+    """Normalise to upper case without whitespace and drop blanks and repeats, keeping order"""
+    seen = set()
+    gstins = []
+    for value in values:
+        gstin = ''.join(str(value or '').split()).upper()
+        if gstin and gstin not in seen:
+            seen.add(gstin)
+            gstins.append(gstin)
+    return gstins
+
+
+def _verify_one(gstin: str, api_key: str, api_secret: str, include_returns: bool, invoice_date: str) -> Dict:
+    result = {'gstin': gstin}
+    result['verification'] = gstin_utils.verify_gstin_and_get_details(gstin, api_key, api_secret)
+    if include_returns:
+        result['return_history'] = gstin_utils.get_return_history(
+            gstin=gstin,
+            api_key=api_key,
+            api_secret=api_secret,
+            invoice_date=invoice_date,
+        )
+    return result
+
+
+def verify_gstins_iter(gstins: List[str], api_key: str, api_secret: str, include_returns: bool = False,
+                       invoice_date: str = None, concurrency: int = None) -> Iterator[Dict]:
+    """
+    Verify GSTINs concurrently and yield one result per GSTIN as it completes
+
+    GSTINs failing offline validation are yielded first without an API call.
+    The Sandbox calls go through the shared token, connection pool and lookup caches.
+    """
+    concurrency = max(1, min(concurrency or DEFAULT_CONCURRENCY, MAX_CONCURRENCY))
+    if include_returns and not invoice_date:
+        invoice_date = datetime.now().strftime('%d/%m/%Y')
+
+    to_verify = []
+    for gstin in gstins:
+        is_valid, reason = gstin_utils.validate_gstin_structure(gstin)
+        if is_valid:
+            to_verify.append(gstin)
+        else:
+            yield {
+                'gstin': gstin,
+                'verification': {'is_valid': False, 'error': f"Invalid GSTIN format: {reason}"}
+            }
+
+    if not to_verify:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(to_verify)), thread_name_prefix="gstin-bulk")
+    try:
+        futures = {
+            executor.submit(_verify_one, gstin, api_key, api_secret, include_returns, invoice_date): gstin
+            for gstin in to_verify
+        }
+        for future in as_completed(futures):
+            gstin = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.error(f"Bulk verification failed for {gstin}: {e}")
+                yield {'gstin': gstin, 'verification': {'is_valid': False, 'error': f"Request failed: {str(e)}"}}
+    finally:
+        # Stop queued lookups if the client goes away mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize(results: List[Dict]) -> Dict[str, int]:
+    summary = {'total': len(results), 'valid': 0, 'invalid': 0, 'errors': 0}
+    for result in results:
+        verification = result.get('verification', {})
+        if verification.get('is_valid'):
+            summary['valid'] += 1
+        elif verification.get('status') or (verification.get('error') or '').startswith(
+                ("Invalid GSTIN format", "GSTIN not found")):
+            summary['invalid'] += 1
+        else:
+            summary['errors'] += 1
+    return summary
+
+
+def collect_request_gstins(json_data: Dict, csv_text: str = None) -> Tuple[List[str], str]:
+    """
+    Gather GSTINs from a JSON body ('gstins' list or 'csv' string) and/or uploaded CSV text
+    Returns (gstins, error)
+    """
+    values = []
+    if json_data:
+        raw = json_data.get('gstins') or []
+        if isinstance(raw, str):
+            raw = raw.replace(',', '\n').splitlines()
+        values.extend(raw)
+        if json_data.get('csv'):
+            values.extend(parse_gstin_csv(json_data['csv']))
+    if csv_text:
+        values.extend(parse_gstin_csv(csv_text))
+
+    gstins = dedupe_gstins(values)
+    if not gstins:
+        return [], "No GSTINs provided"
+    if len(gstins) > MAX_GSTINS:
+        return [], f"Too many GSTINs ({len(gstins)}); the limit is {MAX_GSTINS} per request"
+    return gstins, None
@@ -1,12 +1,10 @@
 import os
 import logging
-import requests
-import json
 import re
 from datetime import datetime
-from requests.exceptions import HTTPError
 from dotenv import load_dotenv
-from gstin_utils import verify_gstin, get_return_history
+from gstin_utils import get_return_history, get_filed_returns
+import sandbox_auth
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -17,64 +15,42 @@ API_SECRET = os.getenv("SANDBOX_API_SECRET")
 API_VERSION = "1.0"
 
 def auth_token() -> str:
-    """Get authentication token from Sandbox API"""
-    headers = {
-        "accept": "application/json",
-        "x-api-key": API_KEY,
-        "x-api-secret": API_SECRET,
-        "x-api-version": API_VERSION,
-    }
-    try:
-        resp = requests.post(f"{BASE_URL}/authenticate", headers=headers, timeout=10)
-        resp.raise_for_status()
-        return resp.json().get("access_token", "")
-    except Exception as e:
-        logger.error(f"Authentication failed: {e}")
-        return ""
+    """Get authentication token from the shared Sandbox token cache"""
+    return sandbox_auth.get_access_token(API_KEY, API_SECRET) or ""
 
 def check_gst_return_filing_status(gstin: str, period: str) -> str:
     """
-    Check if GST returns are filed for a specific period
+    Check if GST returns are filed for a specific period (MMYYYY)
+    Answered from the cached filed-returns list of the period's financial year
     """
     try:
-        token = auth_token()
-        if not token:
-            return "AUTH_ERROR"
-        
-        url = f"{BASE_URL}/gst/compliance/taxpayer/returns"
-        
-        headers = {
-            "accept": "application/json",
-            "authorization": f"Bearer {token}",
-            "x-api-key": API_KEY,
-            "x-api-version": API_VERSION,
-            "content-type": "application/json"
-        }
+        month, year = int(period[:2]), int(period[2:])
+        start_year = year if month >= 4 else year - 1
+        financial_year = f"{start_year}-{str(start_year + 1)[2:]}"
+    except (ValueError, TypeError):
+        logger.error(f"Invalid return period: {period}")
+        return "ERROR"
+    
+    try:
+        fetched = get_filed_returns(gstin, financial_year, API_KEY, API_SECRET)
         
-        payload = {
-            "gstin": gstin,
-            "ret_period": period
-        }
+        if not fetched.get('success'):
+            if fetched.get('error') == "Authentication failed":
+                return "AUTH_ERROR"
+            return "API_ERROR"
         
-        response = requests.post(url, headers=headers, json=payload, timeout=15)
+        gstr1_status = "NOT_FILED"
+        gstr3b_status = "NOT_FILED"
         
-        if response.status_code == 200:
-            data = response.json()
-            returns = data.get("data", {}).get("returns", [])
-            
-            gstr1_status = "NOT_FILED"
-            gstr3b_status = "NOT_FILED"
-            
-            for ret in returns:
-                if ret.get("ret_typ") == "GSTR1":
-                    gstr1_status = ret.get("status", "NOT_FILED")
-                elif ret.get("ret_typ") == "GSTR3B":
-                    gstr3b_status = ret.get("status", "NOT_FILED")
-            
-            return f"GSTR-1: {gstr1_status}, GSTR-3B: {gstr3b_status}"
+        for ret in fetched.get('efiled_list', []):
+            if ret.get('ret_prd') != period:
+                continue
+            if ret.get('rtntype') == "GSTR1":
+                gstr1_status = ret.get("status", "NOT_FILED")
+            elif ret.get('rtntype') == "GSTR3B":
+                gstr3b_status = ret.get("status", "NOT_FILED")
         
-        else:
-            return "API_ERROR"
+        return f"GSTR-1: {gstr1_status}, GSTR-3B: {gstr3b_status}"
             
     except Exception as e:
         logger.error(f"GST return filing check failed: {e}")
@@ -1,15 +1,38 @@
+import hashlib
 import json
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 import boto3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import re
+from dotenv import load_dotenv
+
+from duplicate_fingerprints import build_fingerprint_index
+from duplicate_snapshot import build_snapshot_store
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 s3 = boto3.client('s3')
 
+HISTORY_DAYS = int(os.getenv("DUPLICATE_HISTORY_DAYS", "90"))
+# Invoices stored since the last rebuild are searched by brute force until
+# there are this many, then merged into the kd-tree
+BUFFER_SIZE = int(os.getenv("DUPLICATE_BUFFER_SIZE", "256"))
+NEIGHBORS = 3
+# Concurrent S3 listings/downloads when loading history
+LOAD_WORKERS = int(os.getenv("DUPLICATE_LOAD_WORKERS", "16"))
+# Bump when _compute_features changes; stored vectors of other versions are recomputed
+FEATURE_VERSION = 2
+# Record fields kept for snapshot rows, enough for the duplicate report
+SUMMARY_FIELDS = ['invoice_number', 'vendor_name', 'amount', 'invoice_date', 'processed_at']
+
 class DuplicatePaymentDetector:
     def __init__(self, s3_bucket):
         self.s3_bucket = s3_bucket
@@ -17,51 +40,114 @@ class DuplicatePaymentDetector:
         self.knn_model = None
         self.payment_history = []
         self.feature_names = ['amount', 'vendor_hash', 'days_from_epoch']
+        self.fingerprints = build_fingerprint_index(s3, s3_bucket)
+        self.snapshots = build_snapshot_store(s3, s3_bucket)
+
+        # Row i of the index is payment_history[i]; rows before _indexed_count are
+        # in the kd-tree, the rest are the buffer
+        self._features = []
+        self._stored_days = []
+        self._keys = []
+        self._indexed_count = 0
+        self._index_day = None
+        # Day from which other workers' invoices may be missing from this index
+        self._watermark = None
+        self._loaded = False
+        self._rebuilding = False
+        self._rebuild_scheduled = False
+        self._lock = threading.Lock()
+        # Background merges and snapshot writes, one at a time and off the request path
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="duplicate-index")
+        self._load_lock = threading.Lock()
+        self.stats = {'snapshot_rows': 0, 'history_loaded': 0, 'added': 0, 'rebuilds': 0, 'aged_out': 0, 'last_load': None}
         
-    def _load_payment_history(self, days_back=90):
-        """Load payment history from S3 for the last N days"""
+    def _list_day(self, day):
+        """Keys stored under one day's prefix"""
+        prefix = f"invoice-analysis/{day.strftime('%Y/%m/%d')}/"
+        keys = []
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return day.toordinal(), keys
+
+    def _fetch_record(self, key):
+        response = s3.get_object(Bucket=self.s3_bucket, Key=key)
+        return json.loads(response['Body'].read())
+
+    def _summarize(self, record):
+        return {field: record[field] for field in SUMMARY_FIELDS if field in record}
+
+    def _drain(self, pending, rows, stats, return_when):
+        """Turn finished fetches into index rows, so raw records don't pile up"""
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            key, day = pending.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                logger.error(f"Error loading invoice {key}: {e}")
+                stats['errors'] += 1
+                continue
+            rows.append((key, day, self._summarize(record), self._extract_features(record)))
+            stats['loaded'] += 1
+
+    def _load_payment_history(self, days_back=HISTORY_DAYS, since=None, skip_keys=()):
+        """
+        Load payment history from S3 for the last N days, or from the day
+        ordinal since when that's later, listing only those days' prefixes and
+        fetching records on a bounded thread pool
+        Returns (key, stored day ordinal, record summary, features) rows, or None if listing failed
+        """
+        started = time.monotonic()
+        end_day = date.today()
+        start_day = end_day - timedelta(days=days_back)
+        if since is not None:
+            start_day = max(start_day, date.fromordinal(since))
+        days = [start_day + timedelta(days=n) for n in range((end_day - start_day).days + 1)]
+
+        stats = {'days': len(days), 'listed': 0, 'skipped': 0, 'loaded': 0, 'errors': 0}
+        rows = []
         try:
-            # Calculate date range
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days_back)
-            
-            payments = []
-            
-            # List objects in S3 bucket with date prefix
-            paginator = s3.get_paginator('list_objects_v2')
-            prefix = "invoice-analysis/"
-            
-            for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=prefix):
-                if 'Contents' not in page:
-                    continue
-                    
-                for obj in page['Contents']:
-                    try:
-                        # Extract date from key
-                        key_parts = obj['Key'].split('/')
-                        if len(key_parts) >= 4:
-                            year, month, day = int(key_parts[1]), int(key_parts[2]), int(key_parts[3])
-                            obj_date = datetime(year, month, day)
-                            
-                            # Check if within date range
-                            if start_date <= obj_date <= end_date:
-                                # Load the invoice data
-                                response = s3.get_object(Bucket=self.s3_bucket, Key=obj['Key'])
-                                invoice_data = json.loads(response['Body'].read())
-                                payments.append(invoice_data)
-                    except Exception as e:
-                        logger.error(f"Error loading invoice {obj['Key']}: {e}")
-                        continue
-            
-            self.payment_history = payments
-            logger.info(f"Loaded {len(payments)} payments from history")
-            return payments
-            
+            with ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="duplicate-history") as executor:
+                pending = {}
+                for day, keys in executor.map(self._list_day, days):
+                    for key in keys:
+                        stats['listed'] += 1
+                        if key in skip_keys:
+                            stats['skipped'] += 1
+                            continue
+                        if len(pending) >= LOAD_WORKERS * 2:
+                            self._drain(pending, rows, stats, FIRST_COMPLETED)
+                        pending[executor.submit(self._fetch_record, key)] = (key, day)
+                if pending:
+                    self._drain(pending, rows, stats, ALL_COMPLETED)
         except Exception as e:
             logger.error(f"Error loading payment history: {e}")
-            return []
+            return None
+
+        stats['seconds'] = round(time.monotonic() - started, 3)
+        self.stats['last_load'] = stats
+        logger.info(
+            f"Loaded {stats['loaded']} payments from history in {stats['seconds']}s "
+            f"({stats['listed']} objects listed over {stats['days']} days, "
+            f"{stats['skipped']} already in the snapshot, {stats['errors']} errors)"
+        )
+        return rows
     
     def _extract_features(self, invoice_data):
+        """Feature vector for K-NN, reusing the one stored with the record when it's current"""
+        if invoice_data.get('feature_version') == FEATURE_VERSION and invoice_data.get('feature_vector'):
+            return np.array(invoice_data['feature_vector'], dtype=float)
+        return self._compute_features(invoice_data)
+
+    def encode_features(self, invoice_data):
+        """Feature fields to store with an analysis record so loading history skips re-parsing it"""
+        return {
+            'feature_vector': self._compute_features(invoice_data).tolist(),
+            'feature_version': FEATURE_VERSION
+        }
+
+    def _compute_features(self, invoice_data):
         """Extract numerical features from invoice for K-NN"""
         features = []
         
@@ -77,7 +163,9 @@ class DuplicatePaymentDetector:
         vendor_gstin = invoice_data.get('vendor_gstin', '')
         vendor_name = invoice_data.get('vendor_name', '')
         vendor_str = f"{vendor_gstin}_{vendor_name}"
-        vendor_hash = hash(vendor_str) % 1000000  # Normalize to reasonable range
+        # Stable across processes and restarts, unlike the built-in hash()
+        vendor_digest = hashlib.blake2b(vendor_str.encode('utf-8'), digest_size=8).digest()
+        vendor_hash = int.from_bytes(vendor_digest, 'big') % 1000000  # Normalize to reasonable range
         features.append(vendor_hash)
         
         # 3. Days from epoch (for temporal proximity)
@@ -104,81 +192,311 @@ class DuplicatePaymentDetector:
             
         features.append(days_from_epoch)
         
-        return np.array(features)
+        return np.array(features, dtype=float)
     
+    def _append(self, key, stored_day, record, features):
+        self.payment_history.append(record)
+        self._features.append(features)
+        self._stored_days.append(stored_day)
+        self._keys.append(key)
+
+    def _restore_snapshot(self):
+        """Rows, scaler and kd-tree from the saved snapshot, or None without a usable one"""
+        if self.snapshots is None:
+            return None
+        try:
+            snapshot = self.snapshots.load()
+        except Exception as e:
+            logger.warning(f"Could not load duplicate index snapshot: {e}")
+            return None
+        if snapshot is None:
+            return None
+
+        matrix, manifest = snapshot
+        if manifest.get('feature_version') != FEATURE_VERSION:
+            logger.info("Duplicate index snapshot has an old feature version, ignoring it")
+            return None
+
+        model = None
+        scaler = StandardScaler()
+        if len(matrix) >= 2:
+            params = manifest['scaler']
+            scaler.mean_ = np.array(params['mean'])
+            scaler.scale_ = np.array(params['scale'])
+            scaler.var_ = np.array(params['var'])
+            scaler.n_samples_seen_ = params['n_samples_seen']
+            scaler.n_features_in_ = matrix.shape[1]
+            model = NearestNeighbors(n_neighbors=min(NEIGHBORS, len(matrix)), algorithm='kd_tree')
+            model.fit(scaler.transform(matrix))
+
+        rows = [(key, day, summary, matrix[i]) for i, (key, day, summary) in enumerate(manifest['rows'])]
+        logger.info(f"Restored duplicate index snapshot with {len(rows)} invoices")
+        return {
+            'rows': rows,
+            'scaler': scaler,
+            'model': model,
+            'watermark': manifest['watermark'],
+            'index_day': date.fromordinal(manifest['index_day'])
+        }
+
+    def _save_snapshot(self, rows, matrix, scaler):
+        if self.snapshots is None or self._watermark is None:
+            return
+        manifest = {
+            'feature_version': FEATURE_VERSION,
+            'watermark': self._watermark,
+            'index_day': date.today().toordinal(),
+            'scaler': {
+                'mean': scaler.mean_.tolist(),
+                'scale': scaler.scale_.tolist(),
+                'var': scaler.var_.tolist(),
+                'n_samples_seen': int(scaler.n_samples_seen_)
+            },
+            'rows': [
+                [key, day, self._summarize(record)]
+                for key, day, record, _ in rows
+            ]
+        }
+        try:
+            self.snapshots.save(matrix, manifest)
+        except Exception as e:
+            logger.warning(f"Could not save duplicate index snapshot: {e}")
+
     def train_model(self):
-        """Train K-NN model on payment history"""
-        if not self.payment_history:
-            self._load_payment_history()
-            
-        if len(self.payment_history) < 2:
+        """
+        Index the saved snapshot plus the history stored since its watermark
+        (the whole window without one), together with invoices added since startup
+        """
+        snapshot = self._restore_snapshot()
+        load_day = date.today().toordinal()
+        base = snapshot['rows'] if snapshot else []
+        known = {row[0] for row in base}
+        loaded = self._load_payment_history(since=snapshot['watermark'] if snapshot else None, skip_keys=known)
+        if loaded is None and snapshot is None:
+            return False
+
+        with self._lock:
+            # An invoice stored while the history was loading can be in both
+            known.update(entry[0] for entry in loaded or [])
+            added = list(zip(self._keys, self._stored_days, self.payment_history, self._features))
+            added = [entry for entry in added if entry[0] is None or entry[0] not in known]
+
+            self.payment_history, self._features, self._stored_days, self._keys = [], [], [], []
+            for entry in base + (loaded or []) + added:
+                self._append(*entry)
+            if snapshot and snapshot['model'] is not None:
+                self.scaler, self.knn_model = snapshot['scaler'], snapshot['model']
+                self._indexed_count = len(base)
+                self._index_day = snapshot['index_day']
+            else:
+                self.knn_model = None
+                self._indexed_count = 0
+            # Without a fresh listing the snapshot's watermark still applies
+            self._watermark = load_day if loaded is not None else snapshot['watermark']
+            self.stats['snapshot_rows'] = len(base)
+            self.stats['history_loaded'] = len(loaded or [])
+            self._loaded = True
+            needs_merge = self.knn_model is None or len(self.payment_history) - self._indexed_count >= BUFFER_SIZE
+
+        trained = self._rebuild_index() if needs_merge else True
+        if not trained:
             logger.warning("Not enough payment history to train model")
+        return trained
+
+    def _rebuild_index(self):
+        """
+        Build a new kd-tree over every row in the history window, merging the
+        buffer and dropping aged-out rows; queries keep using the old tree meanwhile
+        """
+        with self._lock:
+            if self._rebuilding:
+                return self.knn_model is not None
+            self._rebuilding = True
+            count = len(self.payment_history)
+            cutoff = (date.today() - timedelta(days=HISTORY_DAYS)).toordinal()
+            keep = [i for i in range(count) if self._stored_days[i] >= cutoff]
+            rows = [(self._keys[i], self._stored_days[i], self.payment_history[i], self._features[i]) for i in keep]
+
+        try:
+            scaler, model = StandardScaler(), None
+            if len(rows) >= 2:
+                matrix = np.array([row[3] for row in rows])
+                scaled_features = scaler.fit_transform(matrix)
+                model = NearestNeighbors(n_neighbors=min(NEIGHBORS, len(rows)), algorithm='kd_tree')
+                model.fit(scaled_features)
+        except Exception as e:
+            logger.error(f"Error building duplicate index: {e}")
+            with self._lock:
+                self._rebuilding = False
             return False
-            
-        # Extract features from all payments
-        feature_matrix = []
-        for payment in self.payment_history:
-            features = self._extract_features(payment)
-            feature_matrix.append(features)
-        
-        feature_matrix = np.array(feature_matrix)
-        
-        # Scale features
-        self.scaler.fit(feature_matrix)
-        scaled_features = self.scaler.transform(feature_matrix)
-        
-        # Train K-NN model with k=3
-        self.knn_model = NearestNeighbors(n_neighbors=min(3, len(self.payment_history)), 
-                                          algorithm='kd_tree')
-        self.knn_model.fit(scaled_features)
-        
-        logger.info("K-NN model trained successfully")
-        return True
-    
+
+        with self._lock:
+            # Invoices added while the tree was being built stay in the buffer
+            added = list(zip(self._keys[count:], self._stored_days[count:],
+                             self.payment_history[count:], self._features[count:]))
+            self.payment_history, self._features, self._stored_days, self._keys = [], [], [], []
+            for row in rows + added:
+                self._append(*row)
+
+            self.stats['aged_out'] += count - len(rows)
+            self.stats['rebuilds'] += 1
+            self._index_day = date.today()
+            if model is not None:
+                self.scaler, self.knn_model = scaler, model
+                self._indexed_count = len(rows)
+            else:
+                self.knn_model = None
+                self._indexed_count = 0
+            self._rebuilding = False
+
+        logger.info(f"Duplicate index rebuilt with {len(rows)} invoices ({count - len(rows)} aged out)")
+        if model is not None:
+            try:
+                self._background.submit(self._save_snapshot, rows, matrix, scaler)
+            except RuntimeError:
+                # Interpreter shutting down; the next process reloads from the previous snapshot
+                pass
+        return model is not None
+
+    def _schedule_rebuild(self):
+        """Rebuild the index on the background thread; no-op while one is already queued"""
+        with self._lock:
+            if self._rebuild_scheduled:
+                return
+            self._rebuild_scheduled = True
+        self._background.submit(self._run_scheduled_rebuild)
+
+    def _run_scheduled_rebuild(self):
+        try:
+            self._rebuild_index()
+        except Exception as e:
+            logger.error(f"Background duplicate index rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._rebuild_scheduled = False
+
+    def add_invoice(self, invoice_data, key=None):
+        """
+        Add a newly stored invoice to the index so later checks see it
+        It goes to the buffer, which is merged into the kd-tree in the background
+        once it holds BUFFER_SIZE invoices;
+        with its record key it is also added to the exact-match fingerprints
+        """
+        if key:
+            self.fingerprints.add(invoice_data, key)
+        features = self._extract_features(invoice_data)
+        with self._lock:
+            self._append(key, date.today().toordinal(), self._summarize(invoice_data), features)
+            self.stats['added'] += 1
+            # Before the history is loaded there's nothing to merge into; loading indexes it
+            needs_merge = self._loaded and (
+                self.knn_model is None or len(self.payment_history) - self._indexed_count >= BUFFER_SIZE
+            )
+        if needs_merge:
+            self._schedule_rebuild()
+
+    def _nearest(self, features):
+        """(distance, record) of the nearest invoices across the kd-tree and the buffer"""
+        with self._lock:
+            if self.knn_model is None:
+                return []
+            scaled_features = self.scaler.transform([features])
+            distances, indices = self.knn_model.kneighbors(scaled_features)
+            candidates = list(zip(distances[0], indices[0]))
+
+            if len(self.payment_history) > self._indexed_count:
+                buffered = self.scaler.transform(np.array(self._features[self._indexed_count:]))
+                buffer_distances = np.linalg.norm(buffered - scaled_features[0], axis=1)
+                candidates.extend(
+                    (distance, self._indexed_count + i) for i, distance in enumerate(buffer_distances)
+                )
+
+            candidates.sort(key=lambda candidate: candidate[0])
+            return [(float(distance), self.payment_history[idx]) for distance, idx in candidates[:NEIGHBORS]]
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if not self._loaded:
+                self.train_model()
+
+    def warm_up(self):
+        """Restore the snapshot and load recent history on a background thread, ahead of the first check"""
+        threading.Thread(target=self._ensure_loaded, name="duplicate-index-warm-up", daemon=True).start()
+
     def check_duplicate(self, invoice_data, threshold=0.1):
         """
         Check if invoice is potentially a duplicate
         Returns: (is_duplicate, similarity_score, similar_invoices)
         """
-        if self.knn_model is None:
-            if not self.train_model():
-                return False, 0.0, []
+        if not self._loaded:
+            self._ensure_loaded()
+        elif self._index_day != date.today():
+            # Daily merge so invoices age out of the window; this check uses the current index
+            self._schedule_rebuild()
         
-        # Extract features from current invoice
+        # Extract features from current invoice and find nearest neighbors
         features = self._extract_features(invoice_data)
-        scaled_features = self.scaler.transform([features])
-        
-        # Find nearest neighbors
-        distances, indices = self.knn_model.kneighbors(scaled_features)
+        neighbors = self._nearest(features)
+        if not neighbors:
+            return False, 0.0, []
         
         # Check if any neighbor is suspiciously close
-        min_distance = distances[0][0] if len(distances[0]) > 0 else float('inf')
+        min_distance = neighbors[0][0]
         
         # Get similar invoices
         similar_invoices = []
-        for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            if dist < threshold and idx < len(self.payment_history):
-                similar_invoice = self.payment_history[idx].copy()
-                similar_invoice['similarity_distance'] = float(dist)
+        for dist, record in neighbors:
+            if dist < threshold:
+                similar_invoice = record.copy()
+                similar_invoice['similarity_distance'] = dist
                 similar_invoices.append(similar_invoice)
         
         # Calculate similarity score (0-100, where 100 is identical)
-        similarity_score = max(0, (1 - min_distance) * 100) if min_distance != float('inf') else 0
+        similarity_score = max(0, (1 - min_distance) * 100)
         
         # Consider it a potential duplicate if distance is below threshold
         is_duplicate = min_distance < threshold
         
         return is_duplicate, similarity_score, similar_invoices
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'loaded': self._loaded,
+                'indexed': self._indexed_count,
+                'buffered': len(self.payment_history) - self._indexed_count,
+                'index_day': self._index_day.isoformat() if self._index_day else None,
+                'fingerprints': self.fingerprints.get_stats(),
+                **self.stats
+            }
     
     def get_duplicate_report(self, invoice_data):
         """Generate a detailed duplicate analysis report"""
+        # Exact resubmissions are found by fingerprint without the K-NN search
+        exact_matches = self.fingerprints.find(invoice_data)
+        if exact_matches:
+            record_ids = sorted({record_id for ids in exact_matches.values() for record_id in ids})
+            return {
+                'is_potential_duplicate': True,
+                'match_type': 'exact',
+                'similarity_score': 100.0,
+                'similar_invoice_count': len(record_ids),
+                'analysis_date': datetime.now().isoformat(),
+                'exact_matches': exact_matches,
+                'matched_record_ids': record_ids,
+                'similar_invoices': []
+            }
+        
         is_duplicate, similarity_score, similar_invoices = self.check_duplicate(invoice_data)
         
         report = {
             'is_potential_duplicate': is_duplicate,
+            'match_type': 'similar' if is_duplicate else None,
             'similarity_score': similarity_score,
             'similar_invoice_count': len(similar_invoices),
             'analysis_date': datetime.now().isoformat(),
+            'exact_matches': {},
+            'matched_record_ids': [],
             'similar_invoices': []
         }
         
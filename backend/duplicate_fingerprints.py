@@ -0,0 +1,244 @@
+"""
+Exact-match duplicate fingerprints
+Hashes of normalized (GSTIN, invoice number) and (GSTIN, amount, date) map to
+the ids of the stored analysis records that produced them, so a resubmitted
+invoice is found with one lookup per fingerprint instead of a K-NN search
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from botocore.exceptions import ClientError
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GSTIN_INVOICE_NUMBER = 'gstin_invoice_number'
+GSTIN_AMOUNT_DATE = 'gstin_amount_date'
+
+_DATE_FORMATS = ['%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%d-%b-%Y']
+_MISSING = {'', 'N/A', 'NONE', 'NULL'}
+# Conditional writes to one fingerprint object before giving up, with jittered backoff between them
+MAX_WRITE_ATTEMPTS = 8
+WRITE_BACKOFF = 0.05
+
+
+def _clean(value: Any) -> str:
+    value = str(value or '').strip().upper()
+    return '' if value in _MISSING else value
+
+
+def normalize_invoice_number(value: Any) -> str:
+    """Upper-case alphanumerics only, so 'inv/001' and 'INV-001' match"""
+    return re.sub(r'[^0-9A-Z]', '', _clean(value))
+
+
+def normalize_amount(value: Any) -> str:
+    try:
+        amount = float(re.sub(r'[^\d.]', '', str(value or '')))
+    except ValueError:
+        return ''
+    return f"{amount:.2f}" if amount > 0 else ''
+
+
+def normalize_date(value: Any) -> str:
+    """ISO date when the format is recognised, otherwise the cleaned string"""
+    value = _clean(value)
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return re.sub(r'[^0-9A-Z]', '', value)
+
+
+def invoice_fingerprints(invoice_data: Dict) -> Dict[str, str]:
+    """Fingerprint digest per kind; kinds whose fields are missing are left out"""
+    gstin = _clean(invoice_data.get('vendor_gstin'))
+    if not gstin:
+        return {}
+
+    parts = {}
+    invoice_number = normalize_invoice_number(invoice_data.get('invoice_number'))
+    if invoice_number:
+        parts[GSTIN_INVOICE_NUMBER] = [gstin, invoice_number]
+    amount = normalize_amount(invoice_data.get('amount', invoice_data.get('total_amount')))
+    invoice_date = normalize_date(invoice_data.get('invoice_date'))
+    if amount and invoice_date:
+        parts[GSTIN_AMOUNT_DATE] = [gstin, amount, invoice_date]
+
+    return {
+        kind: hashlib.sha256('|'.join([kind] + values).encode('utf-8')).hexdigest()
+        for kind, values in parts.items()
+    }
+
+
+class DiskFingerprintStore:
+    """One empty file per (fingerprint, record id) under a directory per fingerprint"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def record_ids(self, digest: str) -> List[str]:
+        try:
+            return sorted(unquote(name) for name in os.listdir(os.path.join(self.directory, digest)))
+        except FileNotFoundError:
+            return []
+
+    def add(self, digest: str, record_id: str):
+        path = os.path.join(self.directory, digest, quote(record_id, safe=''))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'a').close()
+
+
+class S3FingerprintStore:
+    """
+    One JSON object per fingerprint listing its record ids, so a lookup is a single GET;
+    adds are conditional writes on the object's ETag, retried when another worker
+    wrote first, so concurrent adds can't lose ids
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "duplicate-fingerprints/"):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _get(self, digest: str) -> Tuple[List[str], Optional[str]]:
+        """(record ids, ETag); ETag is None when the fingerprint has no object yet"""
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{digest}")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return [], None
+            raise
+        return json.loads(obj['Body'].read()), obj['ETag']
+
+    def record_ids(self, digest: str) -> List[str]:
+        return self._get(digest)[0]
+
+    def add(self, digest: str, record_id: str):
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, WRITE_BACKOFF * attempt))
+            record_ids, etag = self._get(digest)
+            if record_id in record_ids:
+                return
+            condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+            try:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=f"{self.prefix}{digest}",
+                    Body=json.dumps(record_ids + [record_id]),
+                    ContentType='application/json',
+                    **condition
+                )
+                return
+            except ClientError as e:
+                # Another worker's write landed first (or is in flight); re-read and retry
+                if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    raise
+        raise RuntimeError(f"Fingerprint {digest[:12]} kept changing; {record_id} not added")
+
+
+class FingerprintIndex:
+    def __init__(self, store=None, max_size: int = 100000, ttl: float = 24 * 60 * 60,
+                 negative_ttl: float = 30):
+        """
+        Args:
+            store: Optional DiskFingerprintStore/S3FingerprintStore persisting the
+                index; the in-memory tier alone only knows this process's invoices
+            max_size: Fingerprints kept in memory
+            ttl: Lifetime in seconds of in-memory matches; other workers' ids
+                for a cached fingerprint show up after this
+            negative_ttl: Lifetime in seconds of cached misses, which spare new
+                invoices a store lookup; another worker's resubmission of the
+                same invoice within this window is left to the K-NN check
+        """
+        self.store = store
+        self._memory = TTLCache(name="duplicate_fingerprints", max_size=max_size, ttl=ttl,
+                                negative_ttl=negative_ttl, jitter=0)
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'matches': 0, 'writes': 0, 'store_errors': 0}
+
+    def _read(self, digest: str) -> List[str]:
+        record_ids = self._memory.get(digest)
+        if record_ids is not None or self.store is None:
+            return list(record_ids or [])
+
+        record_ids = self.store.record_ids(digest)
+        self._memory.set(digest, record_ids, negative=not record_ids)
+        return list(record_ids)
+
+    def find(self, invoice_data: Dict) -> Dict[str, List[str]]:
+        """Prior record ids per matching fingerprint kind; empty when nothing matches"""
+        matches = {}
+        for kind, digest in invoice_fingerprints(invoice_data).items():
+            try:
+                record_ids = self._read(digest)
+            except Exception as e:
+                logger.warning(f"Fingerprint lookup failed for {kind}: {e}")
+                self._count('store_errors')
+                continue
+            if record_ids:
+                matches[kind] = record_ids
+        self._count('lookups')
+        if matches:
+            self._count('matches')
+        return matches
+
+    def add(self, invoice_data: Dict, record_id: str):
+        """Record that record_id has this invoice's fingerprints"""
+        for kind, digest in invoice_fingerprints(invoice_data).items():
+            if self.store is None:
+                record_ids = self._memory.get(digest) or []
+                if record_id not in record_ids:
+                    self._memory.set(digest, record_ids + [record_id])
+                self._count('writes')
+                continue
+            try:
+                self.store.add(digest, record_id)
+                # Listed afresh on the next lookup, with every worker's ids
+                self._memory.delete(digest)
+                self._count('writes')
+            except Exception as e:
+                logger.warning(f"Fingerprint write failed for {kind}: {e}")
+                self._count('store_errors')
+                # Still matched by this worker
+                self._memory.set(digest, (self._memory.get(digest) or []) + [record_id])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['memory_size'] = self._memory.get_stats()['size']
+        stats['store'] = type(self.store).__name__ if self.store else None
+        return stats
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+
+def build_fingerprint_index(s3_client, bucket: Optional[str]) -> FingerprintIndex:
+    """Fingerprint index with the store selected by DUPLICATE_FINGERPRINT_BACKEND (s3, disk or memory)"""
+    backend = os.getenv("DUPLICATE_FINGERPRINT_BACKEND", "s3").lower()
+    store = None
+    if backend == 's3' and bucket:
+        store = S3FingerprintStore(s3_client, bucket, os.getenv("DUPLICATE_FINGERPRINT_PREFIX", "duplicate-fingerprints/"))
+    elif backend == 'disk':
+        store = DiskFingerprintStore(os.getenv("DUPLICATE_FINGERPRINT_DIR", "duplicate_fingerprints"))
+    return FingerprintIndex(
+        store,
+        max_size=int(os.getenv("DUPLICATE_FINGERPRINT_CACHE_SIZE", "100000")),
+        negative_ttl=float(os.getenv("DUPLICATE_FINGERPRINT_NEGATIVE_TTL", "30"))
+    )
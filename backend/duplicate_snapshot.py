@@ -0,0 +1,146 @@
+"""
+Duplicate-index snapshots
+The detector's feature matrix is saved as a .npy file, memory-mapped on load,
+next to a JSON manifest holding the scaler parameters, the row -> record
+mapping and the history watermark; kept on local disk and optionally in S3
+so a new process doesn't re-read the whole history window
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class IndexSnapshotStore:
+    def __init__(self, directory: str, s3_client=None, bucket: Optional[str] = None,
+                 prefix: str = "duplicate-index/"):
+        """
+        Args:
+            directory: Local directory the snapshot is written to and memory-mapped from
+            s3_client, bucket: Optional S3 copy shared by every worker and deploy
+            prefix: S3 key prefix of the snapshot objects
+        """
+        self.directory = directory
+        self.s3 = s3_client if bucket else None
+        self.bucket = bucket
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, matrix: np.ndarray, manifest: Dict):
+        """
+        Write a new snapshot; the manifest is written last and names its
+        features file, so readers never pair a manifest with another matrix.
+        The local manifest is replaced only after the S3 copy is complete, since
+        workers sharing the directory delete the matrix it replaces
+        """
+        snapshot_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        features_name = f"features-{snapshot_id}.npy"
+        manifest = dict(manifest, snapshot_id=snapshot_id, features=features_name,
+                        row_count=len(matrix), created_at=time.time())
+
+        features_path = os.path.join(self.directory, features_name)
+        self._write_atomic(features_path, lambda f: np.save(f, np.ascontiguousarray(matrix, dtype=np.float64)))
+
+        if self.s3 is not None:
+            previous = self._read_remote_manifest()
+            self.s3.upload_file(features_path, self.bucket, f"{self.prefix}{features_name}")
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}{MANIFEST_NAME}",
+                Body=json.dumps(manifest),
+                ContentType='application/json'
+            )
+            if previous and previous.get('features') != features_name:
+                self.s3.delete_object(Bucket=self.bucket, Key=f"{self.prefix}{previous['features']}")
+
+        self._replace_local_manifest(manifest)
+        logger.info(f"Saved duplicate index snapshot {snapshot_id} with {len(matrix)} rows")
+
+    def load(self) -> Optional[Tuple[np.ndarray, Dict]]:
+        """(memory-mapped feature matrix, manifest) of the newest snapshot, or None"""
+        manifest = self._read_local_manifest()
+        remote = self._read_remote_manifest()
+        if remote and (manifest is None or remote.get('created_at', 0) > manifest.get('created_at', 0)):
+            # A newer snapshot from another worker or deploy; fetch it and keep a local copy
+            features_path = os.path.join(self.directory, remote['features'])
+            tmp_path = f"{features_path}.{uuid.uuid4().hex[:8]}.tmp"
+            self.s3.download_file(self.bucket, f"{self.prefix}{remote['features']}", tmp_path)
+            os.replace(tmp_path, features_path)
+            self._replace_local_manifest(remote)
+            manifest = remote
+
+        if manifest is None:
+            return None
+        matrix = np.load(os.path.join(self.directory, manifest['features']), mmap_mode='r')
+        if matrix.shape[0] != manifest.get('row_count') or matrix.shape[0] != len(manifest.get('rows', [])):
+            logger.warning(f"Duplicate index snapshot {manifest.get('snapshot_id')} is inconsistent, ignoring it")
+            return None
+        return matrix, manifest
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_local_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self._manifest_path(), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _read_remote_manifest(self) -> Optional[Dict]:
+        if self.s3 is None:
+            return None
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{MANIFEST_NAME}")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(obj['Body'].read())
+
+    def _write_atomic(self, path: str, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _replace_local_manifest(self, manifest: Dict):
+        """
+        Point the local manifest at a new matrix and delete only the matrix the
+        old manifest named; other files may be peers' snapshots still being written
+        """
+        previous = self._read_local_manifest()
+        self._write_atomic(self._manifest_path(), lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        if previous and previous.get('features') and previous['features'] != manifest['features']:
+            # A file still memory-mapped by some process stays readable after unlinking
+            try:
+                os.remove(os.path.join(self.directory, previous['features']))
+            except FileNotFoundError:
+                pass
+
+
+def build_snapshot_store(s3_client, bucket: Optional[str]) -> Optional[IndexSnapshotStore]:
+    """Snapshot store selected by DUPLICATE_SNAPSHOT_BACKEND: s3 (local copy plus S3), disk, or none"""
+    backend = os.getenv("DUPLICATE_SNAPSHOT_BACKEND", "s3").lower()
+    if backend not in ('s3', 'disk'):
+        return None
+    directory = os.getenv("DUPLICATE_SNAPSHOT_DIR", "duplicate_index")
+    if backend == 's3' and bucket:
+        return IndexSnapshotStore(directory, s3_client, bucket, os.getenv("DUPLICATE_SNAPSHOT_PREFIX", "duplicate-index/"))
+    return IndexSnapshotStore(directory)
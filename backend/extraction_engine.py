@@ -0,0 +1,252 @@
+"""
+Field extraction rules for invoice text
+Patterns are compiled once at import and each document is split and
+upper-cased once; each field's rules then scan that shared copy in priority
+order (one scan per rule, not one combined pass, since the rules overlap and
+the first match wins). parse_invoice_text is pure (no AWS or Sandbox calls) so
+it can run in worker processes and offline benchmarks
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Union
+
+from word2number import w2n
+
+import gstin_utils
+from vendor_directory import VendorDirectory, vendor_directory as default_vendor_directory
+
+logger = logging.getLogger(__name__)
+
+GSTIN_PATTERN = r'\b\d{2}[A-Z]{5}\d{4}[A-Z][0-9A-Z]{3}\b'
+GSTIN_RE = re.compile(GSTIN_PATTERN)
+
+# Invoice numbers: known vendor formats first, then labelled and generic shapes in priority order.
+# Each rule carries the literals one of which must appear for it to match, so most rules
+# are skipped with a substring check instead of a regex scan. The labelled rule must not
+# capture the word INVOICE itself, as in a "TAX INVOICE" heading above "Invoice No: ..."
+_DIRECT_INVOICE_NUMBER_RE = re.compile(r'\b(UTL/PI\d+|AIN\d{10,}|ININMH\d{10,})\b')
+_INVOICE_NUMBER_RULES = [(hints, re.compile(p, re.MULTILINE)) for hints, p in (
+    (('UTL/PI',), r'\b(UTL/PI\d+)\b'),
+    (('AIN',), r'\b(AIN\d{10,})\b'),
+    (('ININMH',), r'\b(ININMH\d{10,})\b'),
+    (('INV', 'BILL'), r'(?:INVOICE|INV|BILL)\s*(?:NO|NUMBER|#)?\s*[:.-]?\s*(?!INVOICE\b)([A-Z0-9][-A-Z0-9/\\]{4,})'),
+    (('INVOICE NUMBER', 'INV NO', 'BILL NO'), r'(?:INVOICE NUMBER|INV NO|BILL NO)\s*[:.-]?\s*([A-Z0-9][-A-Z0-9/\\]{4,})'),
+    (('INVOICE',), r'(?:INVOICE|PROFORMA INVOICE)\s+([A-Z0-9][-A-Z0-9/\\]{4,})\s+(?:DATED|DATE)'),
+    (('/',), r'\b([A-Z]{2,5}/[A-Z0-9]+/?\d+)\b'),
+    (('-',), r'\b([A-Z]{2,5}-\d{4,})\b'),
+    (('INV',), r'\b(INV-?\d{4,})\b'),
+)]
+_INVOICE_NUMBER_STOPWORD_RE = re.compile(
+    r'^(DATE|DATED|TIME|GSTIN|GST|PAN|CIN|UNITED|AKHIL|NAME|EMAIL|PHONE|MOBILE|ADDRESS|TOTAL|AMOUNT|CUSTOMER|ENTORY|INVENTORY)$'
+)
+_PHONE_NUMBER_RE = re.compile(r'^\d{10}$')
+_PIN_CODE_RE = re.compile(r'^\d{6}$')
+_ADDRESS_WORD_RE = re.compile(r'(ROAD|STREET|FLOOR|BUILDING|BANGALORE|DELHI|MUMBAI|CHENNAI|KOLKATA)')
+_KNOWN_PREFIX_RE = re.compile(r'^(UTL/|AIN|ININMH)')
+_LETTER_RE = re.compile(r'[A-Z]')
+_DIGIT_RE = re.compile(r'\d')
+
+# Dates, first rule that matches wins. The labels in front of the dates ("DATE:", "DATED")
+# were optional and never changed which date is captured first, so they are left out;
+# bare dd/mm/yyyy and yyyy/mm/dd forms are already covered by the first and last rules
+_DATE_RES = [re.compile(p, re.IGNORECASE) for p in (
+    r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})',
+    r'(\d{1,2}[-/](?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[-/]\d{4})',
+    r'(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[A-Z]*\s+\d{1,2},?\s+\d{4}',
+    r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+)]
+
+# Amounts: the final-amount keywords win; otherwise the largest plausible amount
+_FINAL_AMOUNT_RE = re.compile(
+    r'(?:GRAND TOTAL|FINAL AMOUNT|TOTAL AMOUNT IN INR)\s*(?:₹|RS\.?|INR)?\s*([0-9,]+(?:\.[0-9]{2})?)', re.IGNORECASE
+)
+_AMOUNT_RES = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in (
+    r'(?:TOTAL|SUBTOTAL|TOTAL AMOUNT|NET AMOUNT)\s*(?:₹|RS\.?|INR)?\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'₹\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'Rs\.?\s*([0-9,]+(?:\.[0-9]{2})?)',
+    r'\b([0-9]{1,3}(?:,[0-9]{3})+(?:\.[0-9]{2})?)\b',
+)]
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+_AMOUNT_IN_WORDS_RE = re.compile(r"Amount in words[:\-\s]*:?\s*([A-Za-z\s\-]+?)(?:\n|$|Rs|Rupees)", re.IGNORECASE)
+# Whole words only: "and" must not be cut out of "thousand"
+_AMOUNT_WORDS_NOISE_RE = re.compile(r'\b(?:rupees?|only|and|paise|rs)\b\.?', re.IGNORECASE)
+MIN_AMOUNT = 0.01
+MAX_AMOUNT = 100000000
+MIN_AMOUNT_IN_WORDS = 100
+
+# Vendor names: the known-vendor directory, then company-shaped lines near the top
+_VENDOR_LINE_RES = [re.compile(p, re.IGNORECASE) for p in (
+    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:PVT\.?\s*)?(?:LTD|LIMITED)\.?)$',
+    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:PRIVATE\s+)?LIMITED)$',
+    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:TECHNOLOGIES|SOLUTIONS|SERVICES|ENTERPRISES|INDUSTRIES))$',
+    r'(?:FROM|SOLD BY|SUPPLIER|VENDOR)\s*[:.-]\s*([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*)',
+)]
+_VENDOR_SKIP_WORD_RE = re.compile(r'(?:INVOICE|BILL|GST|GSTIN|DATE|ORIGINAL|TAX|PROFORMA|SIGNATURE)', re.IGNORECASE)
+_DIGITS_ONLY_RE = re.compile(r'^\d+$')
+_DATE_IN_LINE_RE = re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}')
+_VENDOR_SKIP_LINES = ('NAME: AKHIL SINGH', 'AKHIL SINGH')
+
+INVOICE_NUMBER_LINES = 30
+VENDOR_NAME_LINES = 15
+
+
+class _Document:
+    """The text split and upper-cased once, shared by every rule"""
+
+    __slots__ = ('text', 'upper', 'lines')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.upper = text.upper()
+        self.lines = [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def _find_gstins(doc: _Document) -> List[str]:
+    """Checksum-valid GSTINs first (OCR confusions corrected), else format-only matches"""
+    valid = gstin_utils.find_gstin_candidates(doc.text)
+    return valid or GSTIN_RE.findall(doc.upper)
+
+
+def _is_invoice_number_candidate(candidate: str) -> bool:
+    return (len(candidate) >= 4 and
+            not _INVOICE_NUMBER_STOPWORD_RE.match(candidate) and
+            not _PHONE_NUMBER_RE.match(candidate) and
+            not _PIN_CODE_RE.match(candidate) and
+            not _ADDRESS_WORD_RE.search(candidate))
+
+
+def _find_invoice_number(doc: _Document) -> str:
+    for line in doc.lines[:INVOICE_NUMBER_LINES]:
+        match = _DIRECT_INVOICE_NUMBER_RE.search(line.upper())
+        if match:
+            return match.group(1)
+
+    for hints, pattern in _INVOICE_NUMBER_RULES:
+        if not any(hint in doc.upper for hint in hints):
+            continue
+        valid_matches = [m.strip() for m in pattern.findall(doc.upper) if _is_invoice_number_candidate(m.strip())]
+        if not valid_matches:
+            continue
+
+        for candidate in valid_matches:
+            if _KNOWN_PREFIX_RE.match(candidate):
+                return candidate
+
+        # Prefer structured numbers (letters, digits and a separator)
+        for candidate in valid_matches:
+            if _LETTER_RE.search(candidate) and _DIGIT_RE.search(candidate) and ('/' in candidate or '-' in candidate):
+                return candidate
+        return valid_matches[0]
+
+    return ''
+
+
+def _find_invoice_date(doc: _Document) -> str:
+    for pattern in _DATE_RES:
+        match = pattern.search(doc.upper)
+        if match:
+            return match.group(1 if pattern.groups else 0)
+    return ''
+
+
+def _parse_amount(raw: str) -> Optional[float]:
+    """Numeric amount, or None for values that look like phone numbers, PIN codes or zeros"""
+    clean = _NON_NUMERIC_RE.sub('', raw)
+    if not clean or all(c in '0.' for c in clean):
+        return None
+    try:
+        value = float(clean)
+    except ValueError:
+        return None
+    if (len(clean) == 10 and clean[0] in '6789') or (len(clean) == 6 and '.' not in clean):
+        return None
+    if not MIN_AMOUNT <= value <= MAX_AMOUNT:
+        return None
+    return value
+
+
+def _find_amount(doc: _Document) -> Optional[Union[float, int]]:
+    match = _FINAL_AMOUNT_RE.search(doc.text)
+    if match:
+        try:
+            return float(_NON_NUMERIC_RE.sub('', match.group(1)))
+        except ValueError:
+            pass
+
+    amounts = set()
+    for pattern in _AMOUNT_RES:
+        for raw in pattern.findall(doc.text):
+            value = _parse_amount(raw)
+            if value is not None:
+                amounts.add(value)
+    if amounts:
+        return max(amounts)
+
+    # Fall back to the amount in words
+    match = _AMOUNT_IN_WORDS_RE.search(doc.text)
+    if match:
+        words = _AMOUNT_WORDS_NOISE_RE.sub('', match.group(1).strip()).strip()
+        if words:
+            try:
+                value = w2n.word_to_num(words)
+            except Exception:
+                return None
+            if MIN_AMOUNT_IN_WORDS <= value <= MAX_AMOUNT:
+                return value
+    return None
+
+
+def _find_vendor_name(doc: _Document, directory: VendorDirectory) -> str:
+    known = directory.match(doc.upper)
+    if known:
+        return known['name']
+
+    for line in doc.lines[:VENDOR_NAME_LINES]:
+        if (len(line) < 5 or
+                _VENDOR_SKIP_WORD_RE.search(line) or
+                _DIGITS_ONLY_RE.search(line) or
+                _DATE_IN_LINE_RE.search(line) or
+                line.upper() in _VENDOR_SKIP_LINES):
+            continue
+
+        for pattern in _VENDOR_LINE_RES:
+            match = pattern.match(line)
+            if match:
+                return match.group(1).strip()
+    return ''
+
+
+def parse_invoice_text(text: str, directory: VendorDirectory = None) -> Dict[str, Union[str, bool]]:
+    """
+    Extract invoice fields from OCR or text-layer output
+
+    Args:
+        directory: Known-vendor directory; the one loaded from VENDOR_DIRECTORY_FILE by default
+
+    Returns:
+        Dict with invoice_number, invoice_date, total_amount, vendor_name and
+        vendor_gstin (all stripped strings), plus gstin_validated (the GSTIN
+        passed the offline checksum) and known_vendor (the GSTIN is in the
+        directory, so vendor_name is its canonical name)
+    """
+    if directory is None:
+        directory = default_vendor_directory
+    doc = _Document(text)
+
+    gstins = _find_gstins(doc)
+    vendor_gstin = gstins[0] if gstins else ''
+    amount = _find_amount(doc)
+    known = directory.lookup_gstin(vendor_gstin) if vendor_gstin else None
+
+    fields = {
+        'invoice_number': _find_invoice_number(doc).strip(),
+        'invoice_date': _find_invoice_date(doc).strip(),
+        'total_amount': str(amount) if amount is not None else '',
+        'vendor_name': known['name'] if known else _find_vendor_name(doc, directory).strip(),
+        'vendor_gstin': vendor_gstin,
+        'gstin_validated': bool(vendor_gstin) and gstin_utils.is_valid_gstin(vendor_gstin),
+        'known_vendor': known is not None,
+    }
+    logger.debug(f"Parsed invoice fields: {fields}")
+    return fields
@@ -1,56 +1,162 @@
 # Updated gstin_utils.py with corrected GST returns tracking API
 
+import os
+import re
 import requests
 import logging
 import time
 from typing import Dict, Optional, Tuple, Union, List
-from datetime import datetime
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import sandbox_auth
+from sandbox_client import sandbox_client, SandboxThrottledError, SandboxUnavailableError
+from ttl_cache import TTLCache
 
+load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Taxpayer details and GSTIN search results, keyed "taxpayer:<gstin>" / "search:<gstin>"
+gstin_cache = TTLCache(
+    name="gstin",
+    max_size=int(os.getenv("GSTIN_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("GSTIN_CACHE_TTL", str(7 * 24 * 60 * 60))),
+    negative_ttl=float(os.getenv("GSTIN_NEGATIVE_CACHE_TTL", str(60 * 60))),
+    persist_path=os.getenv("GSTIN_CACHE_FILE") or None,
+    flush_interval=float(os.getenv("GSTIN_CACHE_FLUSH_SECONDS", "5")),
+)
+_NOT_CACHED = object()
+
+# Error reported while the Sandbox circuit breaker is open, so scoring can tell
+# an outage apart from a real verification failure
+VERIFICATION_UNAVAILABLE = "Verification unavailable - Sandbox API degraded"
+# Same for calls still rate limited (no local slot, or 429 after retries); these
+# say nothing about the taxpayer either
+VERIFICATION_THROTTLED = "Verification unavailable - Sandbox API rate limited"
+
+# Filed-returns lists per (GSTIN, FY): closed years are effectively immutable
+RETURNS_CLOSED_FY_TTL = float(os.getenv("GST_RETURNS_CLOSED_FY_TTL", str(30 * 24 * 60 * 60)))
+RETURNS_CURRENT_FY_TTL = float(os.getenv("GST_RETURNS_CURRENT_FY_TTL", str(6 * 60 * 60)))
+RETURNS_GRACE_DAYS = 60
+
+GSTIN_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# 4th character of a PAN: the holder's entity type
+PAN_ENTITY_TYPES = set("ABCEFGHJLPTK")
+GSTIN_CANDIDATE_PATTERN = re.compile(r'\b[0-9A-Z]{15}\b')
+
+# Common OCR confusions, applied only where the GSTIN layout expects the other class
+_OCR_TO_DIGIT = str.maketrans({'O': '0', 'D': '0', 'Q': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'G': '6', 'B': '8'})
+_OCR_TO_LETTER = str.maketrans({'0': 'O', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '8': 'B'})
+_DIGIT_POSITIONS = (0, 1, 7, 8, 9, 10)
+_LETTER_POSITIONS = (2, 3, 4, 5, 6, 11, 13)
+
+def gstin_check_digit(gstin_body: str) -> str:
+    """
+    Compute the mod-36 check character for the first 14 characters of a GSTIN
+    """
+    total = 0
+    for i, char in enumerate(gstin_body[:14]):
+        product = GSTIN_CHARSET.index(char) * (2 if i % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARSET[(36 - total % 36) % 36]
+
+def validate_gstin_structure(gstin: str) -> Tuple[bool, Optional[str]]:
+    """
+    Validate a GSTIN offline: length, state code, embedded PAN, entity number and check digit
+    Returns (is_valid, reason) where reason explains the first failed check
+    """
+    if not gstin or len(gstin) != 15:
+        return False, "GSTIN must be 15 characters"
+    
+    gstin = gstin.upper()
+    if any(c not in GSTIN_CHARSET for c in gstin):
+        return False, "GSTIN contains invalid characters"
+    
+    # Any two digits but 00: besides states/UTs 01-38 there are codes such as 97
+    # (Other Territory) and 99 (Centre jurisdiction)
+    if not gstin[:2].isdigit() or gstin[:2] == '00':
+        return False, f"Invalid state code {gstin[:2]}"
+    
+    pan = gstin[2:12]
+    if not (pan[:5].isalpha() and pan[5:9].isdigit() and pan[9].isalpha()):
+        return False, "Embedded PAN is malformed"
+    if pan[3] not in PAN_ENTITY_TYPES:
+        return False, f"Unknown PAN entity type {pan[3]}"
+    
+    if gstin[12] == '0':
+        return False, "Entity number cannot be 0"
+    # The 14th character is Z for regular registrations but not for every category;
+    # the check digit below is what catches a misread
+    if gstin_check_digit(gstin) != gstin[14]:
+        return False, "Check digit mismatch"
+    
+    return True, None
+
+def is_valid_gstin(gstin: str) -> bool:
+    return validate_gstin_structure(gstin)[0]
+
+def correct_gstin_ocr(candidate: str) -> str:
+    """
+    Undo common OCR character confusions using the fixed GSTIN layout
+    (digits for state code and PAN number, letters for PAN name part and the Z)
+    """
+    chars = list(candidate.upper())
+    if len(chars) != 15:
+        return candidate
+    for i in _DIGIT_POSITIONS:
+        chars[i] = chars[i].translate(_OCR_TO_DIGIT)
+    for i in _LETTER_POSITIONS:
+        chars[i] = chars[i].translate(_OCR_TO_LETTER)
+    return ''.join(chars)
+
+def find_gstin_candidates(text: str) -> List[str]:
+    """
+    Return every GSTIN in the text that passes offline validation, in text order
+    Tokens that only validate after OCR correction are returned in corrected form
+    """
+    candidates = []
+    for token in GSTIN_CANDIDATE_PATTERN.findall(text.upper()):
+        if not is_valid_gstin(token):
+            token = correct_gstin_ocr(token)
+            if not is_valid_gstin(token):
+                continue
+        if token not in candidates:
+            candidates.append(token)
+    return candidates
+
 def authenticate(api_key: str, api_secret: str) -> Optional[str]:
     """
-    Authenticate and get access token for Sandbox API
+    Get access token for Sandbox API from the shared token cache
     Returns the raw token (not prefixed with "Bearer ")
     """
-    try:
-        auth_headers = {
-            "accept": "application/json",
-            "x-api-key": api_key,
-            "x-api-secret": api_secret,
-            "x-api-version": "1.0",
-        }
-        
-        response = requests.post(
-            "https://api.sandbox.co.in/authenticate", 
-            headers=auth_headers, 
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            token_data = response.json()
-            # Get the token from the correct path based on your working example
-            access_token = token_data.get("data", {}).get("access_token")
-            if access_token:
-                return access_token  # Return raw token, not prefixed with "Bearer "
-        
-        logger.error(f"Authentication failed: {response.status_code} - {response.text}")
-        return None
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Authentication request error: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected authentication error: {e}")
-        return None
+    return sandbox_auth.get_access_token(api_key, api_secret)
 
 def get_vendor_name_from_gstin(gstin: str, api_key: str, api_secret: str) -> Optional[str]:
     """
     Fetch vendor name dynamically using GSTIN lookup via Sandbox API
+    Served from the GSTIN cache when the taxpayer or search lookup was seen recently
     """
-    if not gstin or len(gstin) != 15:
+    if not is_valid_gstin(gstin):
         return None
     
+    # A cached taxpayer lookup already carries the same legal name
+    details = gstin_cache.get(f"taxpayer:{gstin}")
+    if details and details.get('vendor_name'):
+        return details['vendor_name']
+    
+    cached_name = gstin_cache.get(f"search:{gstin}", _NOT_CACHED)
+    if cached_name is not _NOT_CACHED:
+        return cached_name
+    
+    vendor_name, definitive = _fetch_vendor_name_from_gstin(gstin, api_key, api_secret)
+    if definitive:
+        gstin_cache.set(f"search:{gstin}", vendor_name, negative=vendor_name is None)
+    return vendor_name
+
+def _fetch_vendor_name_from_gstin(gstin: str, api_key: str, api_secret: str) -> Tuple[Optional[str], bool]:
+    """
+    Call the GSTIN search endpoint
+    Returns (vendor_name, definitive) where definitive is False for transient failures
+    """
     try:
         # If API access is restricted, provide a fallback method
         # For now, we'll return None but you can implement more sophisticated fallback
@@ -58,10 +164,10 @@ def get_vendor_name_from_gstin(gstin: str, api_key: str, api_secret: str) -> Opt
         token = authenticate(api_key, api_secret)
         if not token:
             logger.warning(f"Could not authenticate for GSTIN {gstin}")
-            return None
+            return None, False
         
         # Updated API endpoint for GSTIN lookup
-        url = "https://api.sandbox.co.in/gst/compliance/public/gstin/search"
+        path = "/gst/compliance/public/gstin/search"
         headers = {
             'authorization': token,
             'x-api-key': api_key,
@@ -71,17 +177,18 @@ def get_vendor_name_from_gstin(gstin: str, api_key: str, api_secret: str) -> Opt
             'content-type': 'application/json'
         }
         
-        response = requests.post(url, headers=headers, json={'gstin': gstin}, timeout=10)
+        response = sandbox_client.post('gstin_search', path, headers=headers, json={'gstin': gstin})
         
         if response.status_code == 403:
             logger.error(f"API access restricted for GSTIN lookup: {response.text}")
-            return None
+            return None, False
         
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError:
             logger.error(f"GSTIN lookup failed: {response.status_code} - {response.text}")
-            return None
+            # 400/404 mean the GSTIN itself is unknown, anything else may succeed on retry
+            return None, response.status_code in (400, 404)
         
         data = response.json()
         
@@ -93,11 +200,11 @@ def get_vendor_name_from_gstin(gstin: str, api_key: str, api_secret: str) -> Opt
             data.get('data', {}).get('data', {}).get('tradeName')
         )
         
-        return vendor_name.strip() if vendor_name else None
+        return (vendor_name.strip() if vendor_name else None), True
         
     except Exception as e:
         logger.error(f"Error fetching vendor name: {e}")
-        return None
+        return None, False
 
 def get_vendor_name(gstin: str, api_key: str, api_secret: str) -> Optional[str]:
     """
@@ -146,6 +253,110 @@ def get_financial_year(date_str: str) -> str:
         logger.error(f"Error calculating financial year: {e}")
         return ""
 
+def _is_closed_financial_year(financial_year: str) -> bool:
+    """
+    A financial year is treated as closed once the returns for its last
+    month are past due (GSTR-3B for March is due in April)
+    """
+    try:
+        end_year = int(financial_year.split('-')[0]) + 1
+        return datetime.now() > datetime(end_year, 3, 31) + timedelta(days=RETURNS_GRACE_DAYS)
+    except (ValueError, IndexError):
+        return False
+
+def get_filed_returns(gstin: str, financial_year: str, api_key: str, api_secret: str) -> Dict[str, any]:
+    """
+    Get the raw e-filed returns list (EFiledlist) for a GSTIN and financial year
+    Cached per (GSTIN, FY): closed years for a long time, the current year briefly
+    
+    Returns a dict with 'success', 'efiled_list', 'status_code' and 'error'
+    """
+    cache_key = f"returns:{gstin}:{financial_year}"
+    cached = gstin_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    fetched = _fetch_filed_returns(gstin, financial_year, api_key, api_secret)
+    
+    if fetched['success']:
+        if _is_closed_financial_year(financial_year):
+            ttl = RETURNS_CLOSED_FY_TTL
+        else:
+            ttl = RETURNS_CURRENT_FY_TTL
+        gstin_cache.set(cache_key, fetched, ttl=ttl)
+    
+    return fetched
+
+def _fetch_filed_returns(gstin: str, financial_year: str, api_key: str, api_secret: str) -> Dict[str, any]:
+    """
+    Call the GST returns tracking endpoint for one financial year
+    """
+    fetched = {
+        'success': False,
+        'efiled_list': [],
+        'status_code': None,
+        'error': None
+    }
+    
+    # Get authentication token
+    token = authenticate(api_key, api_secret)
+    if not token:
+        fetched['error'] = "Authentication failed"
+        return fetched
+    
+    # Prepare API request - EXACTLY as shown in curl example
+    headers = {
+        'accept': 'application/json',
+        'authorization': token,  # Raw token from authenticate()
+        'content-type': 'application/json',
+        'x-accept-cache': 'true',
+        'x-api-key': api_key,
+        'x-api-version': '1.0'
+    }
+    
+    # URL with financial_year as query parameter
+    path = f'/gst/compliance/public/gstrs/track?financial_year={financial_year}'
+    
+    # IMPORTANT: Body should ONLY contain gstin - nothing else!
+    payload = {'gstin': gstin}
+    
+    logger.info(f"Making API request to: {path}")
+    logger.info(f"With payload: {payload}")
+    
+    response = sandbox_client.post('gstrs_track', path, headers=headers, json=payload)
+    fetched['status_code'] = response.status_code
+    
+    logger.info(f"API Response Status: {response.status_code}")
+    
+    if response.status_code == 200:
+        data = response.json()
+        
+        # Check if API response is valid
+        if data.get('code') == 200 and 'data' in data:
+            outer_data = data.get('data', {})
+            inner_data = outer_data.get('data', {})
+            fetched['efiled_list'] = inner_data.get('EFiledlist', [])
+            fetched['success'] = True
+            logger.info(f"Found {len(fetched['efiled_list'])} returns in response")
+        else:
+            fetched['error'] = f"Unexpected API response format: {data}"
+            logger.error(f"Unexpected API response: {data}")
+    
+    elif response.status_code == 404:
+        # No returns on record for this year
+        fetched['success'] = True
+        logger.info(f"API returned 404 - No returns found for {gstin}")
+    
+    elif response.status_code == 403:
+        fetched['error'] = "API access restricted - Check API permissions"
+        logger.error(f"API access restricted: {response.text}")
+    
+    else:
+        fetched['error'] = f"API error: {response.status_code} - {response.text}"
+        logger.error(f"API error: {response.status_code} - {response.text}")
+    
+    return fetched
+
 def get_return_history(gstin: str, api_key: str, api_secret: str, invoice_date: str) -> Dict[str, any]:
     """
     Get GST return filing status for a GSTIN for the specific financial year of the invoice date
@@ -160,8 +371,9 @@ def get_return_history(gstin: str, api_key: str, api_secret: str, invoice_date:
         'summary': 'No filing data found'
     }
     
-    if not gstin or len(gstin) != 15:
-        result['error'] = "Invalid GSTIN format"
+    is_valid, reason = validate_gstin_structure(gstin)
+    if not is_valid:
+        result['error'] = f"Invalid GSTIN format: {reason}"
         return result
     
     if not invoice_date:
@@ -169,12 +381,6 @@ def get_return_history(gstin: str, api_key: str, api_secret: str, invoice_date:
         return result
     
     try:
-        # Get authentication token
-        token = authenticate(api_key, api_secret)
-        if not token:
-            result['error'] = "Authentication failed"
-            return result
-        
         # Get financial year from invoice date
         financial_year = get_financial_year(invoice_date)
         if not financial_year:
@@ -184,84 +390,54 @@ def get_return_history(gstin: str, api_key: str, api_secret: str, invoice_date:
         result['financial_year'] = financial_year
         logger.info(f"Checking GST returns for {gstin} in FY: {financial_year}")
         
-        # Prepare API request - EXACTLY as shown in curl example
-        headers = {
-            'accept': 'application/json',
-            'authorization': token,  # Already includes "Bearer " prefix from authenticate()
-            'content-type': 'application/json',
-            'x-accept-cache': 'true',
-            'x-api-key': api_key,
-            'x-api-version': '1.0'
-        }
-        
-        # URL with financial_year as query parameter
-        url = f'https://api.sandbox.co.in/gst/compliance/public/gstrs/track?financial_year={financial_year}'
-        
-        # IMPORTANT: Body should ONLY contain gstin - nothing else!
-        payload = {'gstin': gstin}
+        fetched = get_filed_returns(gstin, financial_year, api_key, api_secret)
         
-        logger.info(f"Making API request to: {url}")
-        logger.info(f"With payload: {payload}")
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=15)
-        
-        logger.info(f"API Response Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
+        if fetched['success']:
+            # Extract filed returns
+            filed_returns = []
+            for ret in fetched['efiled_list']:
+                if ret.get('status') == 'Filed':
+                    filed_returns.append({
+                        'type': ret.get('rtntype', ''),
+                        'period': ret.get('ret_prd', ''),
+                        'date_of_filing': ret.get('dof', ''),
+                        'arn': ret.get('arn', ''),
+                        'mode': ret.get('mof', '')
+                    })
             
-            # Check if API response is valid
-            if data.get('code') == 200 and 'data' in data:
-                outer_data = data.get('data', {})
-                inner_data = outer_data.get('data', {})
-                efiled_list = inner_data.get('EFiledlist', [])
-                
-                logger.info(f"Found {len(efiled_list)} returns in response")
-                
-                # Extract filed returns
-                filed_returns = []
-                for ret in efiled_list:
-                    if ret.get('status') == 'Filed':
-                        filed_returns.append({
-                            'type': ret.get('rtntype', ''),
-                            'period': ret.get('ret_prd', ''),
-                            'date_of_filing': ret.get('dof', ''),
-                            'arn': ret.get('arn', ''),
-                            'mode': ret.get('mof', '')
-                        })
-                
-                if filed_returns:
-                    result['success'] = True
-                    result['filing_exists'] = True
-                    result['details'] = filed_returns
-                    result['summary'] = f"GST filings exist for FY {financial_year}"
-                    logger.info(f"Found {len(filed_returns)} filed returns for {gstin} in FY {financial_year}")
-                else:
-                    result['success'] = True
-                    result['summary'] = f"No GST filings found for FY {financial_year}"
-                    logger.info(f"No filed returns found for {gstin} in FY {financial_year}")
-                    
+            result['success'] = True
+            if filed_returns:
+                result['filing_exists'] = True
+                result['details'] = filed_returns
+                result['summary'] = f"GST filings exist for FY {financial_year}"
+                logger.info(f"Found {len(filed_returns)} filed returns for {gstin} in FY {financial_year}")
             else:
-                result['error'] = f"Unexpected API response format: {data}"
-                logger.error(f"Unexpected API response: {data}")
-                
-        elif response.status_code == 403:
-            result['error'] = "API access restricted - Check API permissions"
-            logger.error(f"API access restricted: {response.text}")
+                result['summary'] = f"No GST filings found for FY {financial_year}"
+                logger.info(f"No filed returns found for {gstin} in FY {financial_year}")
+        
+        elif fetched['status_code'] == 429:
+            result['error'] = VERIFICATION_THROTTLED
+            result['unavailable'] = True
+            logger.warning(f"GST return history skipped for {gstin}: API rate limit exceeded")
+        
+        elif fetched['status_code'] == 403:
+            result['error'] = fetched['error']
             # Still mark as success but with no filings to continue processing
             result['success'] = True
             result['filing_exists'] = False
             result['summary'] = "GST filing check requires API upgrade"
-            
-        elif response.status_code == 404:
-            result['success'] = True  # Considered successful but no filings
-            result['summary'] = f"No GST filings found for FY {financial_year}"
-            logger.info(f"API returned 404 - No returns found for {gstin}")
-            
+        
         else:
-            result['error'] = f"API error: {response.status_code} - {response.text}"
-            logger.error(f"API error: {response.status_code} - {response.text}")
+            result['error'] = fetched['error']
             
+    except SandboxUnavailableError as e:
+        result['error'] = VERIFICATION_UNAVAILABLE
+        result['unavailable'] = True
+        logger.warning(f"GST return history skipped: {e}")
+    except SandboxThrottledError as e:
+        result['error'] = VERIFICATION_THROTTLED
+        result['unavailable'] = True
+        logger.warning(f"GST return history skipped: {e}")
     except Exception as e:
         result['error'] = f"Request failed: {str(e)}"
         logger.error(f"GST return history error: {e}", exc_info=True)
@@ -271,6 +447,38 @@ def get_return_history(gstin: str, api_key: str, api_secret: str, invoice_date:
 def verify_gstin_and_get_details(gstin: str, api_key: str, api_secret: str) -> Dict[str, any]:
     """
     Verify GSTIN and return both validity status and vendor details
+    Results are cached per GSTIN; "not found" answers are cached for a shorter time
+    """
+    # Reject malformed GSTINs locally instead of spending an API call on them
+    is_valid, reason = validate_gstin_structure(gstin)
+    if not is_valid:
+        return {
+            'is_valid': False,
+            'vendor_name': None,
+            'status': None,
+            'registration_date': None,
+            'business_type': None,
+            'error': f"Invalid GSTIN format: {reason}"
+        }
+    
+    cache_key = f"taxpayer:{gstin}"
+    cached = gstin_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    result = _fetch_gstin_details(gstin, api_key, api_secret)
+    
+    # Only cache answers from the taxpayer API itself, never transient failures
+    if result.get('status'):
+        gstin_cache.set(cache_key, result)
+    elif result.get('error') == "GSTIN not found or invalid":
+        gstin_cache.set(cache_key, result, negative=True)
+    
+    return result
+
+def _fetch_gstin_details(gstin: str, api_key: str, api_secret: str) -> Dict[str, any]:
+    """
+    Call the taxpayer GSTIN endpoint and normalise the response
     """
     result = {
         'is_valid': False,
@@ -302,11 +510,11 @@ def verify_gstin_and_get_details(gstin: str, api_key: str, api_secret: str) -> D
             "content-type": "application/json"
         }
         
-        url = "https://api.sandbox.co.in/gst/compliance/taxpayer/gstin"
+        path = "/gst/compliance/taxpayer/gstin"
         payload = {"gstin": gstin}
         
         
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = sandbox_client.post('taxpayer_gstin', path, json=payload, headers=headers)
         if response.status_code == 400 and "Credential" in response.text:
             return {
             'is_valid': False,
@@ -355,13 +563,23 @@ def verify_gstin_and_get_details(gstin: str, api_key: str, api_secret: str) -> D
         elif response.status_code == 401:
             result['error'] = "API authentication failed"
             logger.error("API authentication failed")
+            sandbox_auth.token_provider.invalidate(api_key, api_secret)
         elif response.status_code == 429:
-            result['error'] = "API rate limit exceeded"
-            logger.warning("API rate limit exceeded")
+            result['error'] = VERIFICATION_THROTTLED
+            result['unavailable'] = True
+            logger.warning(f"GSTIN verification skipped for {gstin}: API rate limit exceeded")
         else:
             result['error'] = f"API error: {response.status_code}"
             logger.error(f"API request failed: {response.status_code} - {response.text}")
             
+    except SandboxUnavailableError as e:
+        result['error'] = VERIFICATION_UNAVAILABLE
+        result['unavailable'] = True
+        logger.warning(f"GSTIN verification skipped: {e}")
+    except SandboxThrottledError as e:
+        result['error'] = VERIFICATION_THROTTLED
+        result['unavailable'] = True
+        logger.warning(f"GSTIN verification skipped: {e}")
     except Exception as e:
         result['error'] = f"Request failed: {str(e)}"
         logger.error(f"GSTIN verification error: {e}")
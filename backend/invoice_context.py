@@ -0,0 +1,95 @@
+"""
+Request-scoped state for the invoice processing pipeline
+Carries Sandbox lookup results from extraction through scoring so each
+external lookup happens at most once per invoice
+"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import BrokenExecutor, Executor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import gstin_utils
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceContext:
+    def __init__(self, request_id: str = None, on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 cpu_executor: Optional[Executor] = None):
+        """
+        Args:
+            request_id: Identifier used in logs; generated when omitted
+            on_progress: Optional callback receiving (stage, details) as the pipeline advances
+            cpu_executor: Optional process pool for CPU-heavy steps (PDF text and field parsing)
+        """
+        self.request_id = request_id or uuid.uuid4().hex
+        self.on_progress = on_progress
+        self.cpu_executor = cpu_executor
+        self.metrics: Dict[str, Any] = {}
+        self._results: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._stats = {'lookups': 0, 'reused': 0}
+
+    def memoize(self, kind: str, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Return the result of fn(*args, **kwargs), calling it only the first
+        time a given (kind, key) is requested within this invoice
+        """
+        memo_key = (kind, key)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(memo_key, threading.Lock())
+
+        # Concurrent callers for the same key wait for the first one's result
+        with key_lock:
+            with self._lock:
+                if memo_key in self._results:
+                    self._stats['reused'] += 1
+                    return self._results[memo_key]
+
+            result = fn(*args, **kwargs)
+
+            with self._lock:
+                self._results[memo_key] = result
+                self._stats['lookups'] += 1
+            return result
+
+    def verify_gstin(self, gstin: str, api_key: str, api_secret: str) -> Dict[str, Any]:
+        return self.memoize(
+            'gstin_details', gstin,
+            gstin_utils.verify_gstin_and_get_details, gstin, api_key, api_secret
+        )
+
+    def get_return_history(self, gstin: str, api_key: str, api_secret: str, invoice_date: str) -> Dict[str, Any]:
+        return self.memoize(
+            'return_history', f"{gstin}|{invoice_date}",
+            gstin_utils.get_return_history,
+            gstin=gstin, api_key=api_key, api_secret=api_secret, invoice_date=invoice_date
+        )
+
+    def run_cpu(self, fn: Callable, *args) -> Any:
+        """
+        Call fn(*args) on the CPU executor when one is attached, otherwise inline
+        fn and its arguments must be picklable when the executor is a process pool
+        """
+        if self.cpu_executor is not None:
+            try:
+                return self.cpu_executor.submit(fn, *args).result()
+            except BrokenExecutor as e:
+                logger.error(f"CPU executor unusable for {self.request_id}, running inline: {e}")
+        return fn(*args)
+
+    def report(self, stage: str, **details):
+        """Notify the progress listener, if any; listener errors never break the pipeline"""
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(stage, details)
+        except Exception as e:
+            logger.error(f"Progress callback failed for {self.request_id}: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
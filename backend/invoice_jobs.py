@@ -0,0 +1,172 @@
+"""
+Background invoice-processing jobs
+Uploads are queued onto a bounded worker pool and processed asynchronously;
+callers poll the job or follow its progress events instead of holding an
+HTTP worker for the whole OCR and verification run
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from invoice_context import InvoiceContext
+from upload_spool import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class InvoiceJob:
+    def __init__(self, source: str):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.events: List[Dict[str, Any]] = []
+        self.result: Optional[Dict] = None
+        self.raw_result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, include_events: bool = True) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'source': self.source,
+            'status': self.status,
+            'stage': self.stage,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error,
+        }
+        if include_events:
+            data['progress'] = list(self.events)
+        return data
+
+
+class InvoiceJobManager:
+    def __init__(self, process_fn: Callable[[SpooledUpload, InvoiceContext], Dict],
+                 format_fn: Callable[[Dict], Dict], max_workers: int = 4,
+                 retention_seconds: float = 3600):
+        """
+        Args:
+            process_fn: Pipeline entry point, called as process_fn(pdf, context)
+            format_fn: Turns the pipeline result into the API response body
+            max_workers: Jobs processed concurrently
+            retention_seconds: How long finished jobs stay queryable
+        """
+        self.process_fn = process_fn
+        self.format_fn = format_fn
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="invoice-job")
+        self._jobs: Dict[str, InvoiceJob] = {}
+        self._cond = threading.Condition()
+
+    def submit(self, load_pdf: Callable[[], SpooledUpload], source: str = "api",
+               on_complete: Optional[Callable[[InvoiceJob], None]] = None) -> InvoiceJob:
+        """
+        Queue a job; load_pdf runs on the worker so downloads don't block the caller,
+        and the spooled upload it returns is closed once the job finishes
+        on_complete is called on the worker once the job has succeeded or failed
+        """
+        job = InvoiceJob(source)
+        with self._cond:
+            self._purge_expired()
+            self._jobs[job.id] = job
+        self._add_event(job, QUEUED)
+        self._executor.submit(self._run, job, load_pdf, on_complete)
+        logger.info(f"Queued invoice job {job.id} from {source}")
+        return job
+
+    def get(self, job_id: str) -> Optional[InvoiceJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_for_events(self, job: InvoiceJob, seen: int, timeout: float) -> List[Dict[str, Any]]:
+        """Block until the job has more than `seen` events, the job finishes, or timeout passes"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(job.events) > seen or job.finished, timeout=timeout)
+            return job.events[seen:]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            stats = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                stats[job.status] += 1
+        return stats
+
+    def _add_event(self, job: InvoiceJob, stage: str, details: Dict[str, Any] = None):
+        with self._cond:
+            job.stage = stage
+            job.events.append({
+                'stage': stage,
+                'at': datetime.now(timezone.utc).isoformat(),
+                **(details or {})
+            })
+            self._cond.notify_all()
+
+    def _run(self, job: InvoiceJob, load_pdf: Callable[[], SpooledUpload],
+             on_complete: Optional[Callable[[InvoiceJob], None]]):
+        with self._cond:
+            job.status = RUNNING
+        context = InvoiceContext(
+            request_id=job.id,
+            on_progress=lambda stage, details: self._add_event(job, stage, details)
+        )
+
+        try:
+            context.report("downloading")
+            with load_pdf() as pdf:
+                raw_result = self.process_fn(pdf, context)
+            job.raw_result = raw_result
+            self._finish(job, SUCCEEDED, "completed", result=self.format_fn(raw_result))
+
+        except Exception as e:
+            logger.exception(f"Invoice job {job.id} failed")
+            self._finish(job, FAILED, "failed", error=str(e))
+
+        if on_complete is not None:
+            try:
+                on_complete(job)
+            except Exception:
+                logger.exception(f"Completion callback failed for job {job.id}")
+
+    def _finish(self, job: InvoiceJob, status: str, stage: str, result: Dict = None, error: str = None):
+        # Status and final event change together so event followers never miss the last event
+        with self._cond:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            job.finished_monotonic = time.monotonic()
+            job.stage = stage
+            event = {'stage': stage, 'at': job.finished_at}
+            if error:
+                event['error'] = error
+            job.events.append(event)
+            self._cond.notify_all()
+
+    def _purge_expired(self):
+        # Caller holds self._cond
+        cutoff = time.monotonic() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_monotonic is not None and job.finished_monotonic < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -1,266 +1,315 @@
+import os
 import uuid
 import time
 import logging
+import threading
+from typing import Iterator, Optional, Tuple, Union
 import boto3
-import re
 import json
-from word2number import w2n
 from botocore.exceptions import ClientError
-import gstin_utils
+from dotenv import load_dotenv
+import extraction_engine
+import pdf_text
+from invoice_context import InvoiceContext
+from ocr_cache import DiskTextStore, OcrTextCache, S3TextStore
+import upload_spool
+from upload_spool import SpooledUpload
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 s3 = boto3.client('s3')
 textract = boto3.client('textract')
 
-def _get_full_text(bucket: str, key: str) -> str:
-    """Get full text from PDF using AWS Textract"""
-    resp = textract.start_document_text_detection(
-        DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': key}}
-    )
-    job_id = resp['JobId']
+# Textract polling: start fast, back off, give up at the deadline
+TEXTRACT_POLL_INITIAL = float(os.getenv("TEXTRACT_POLL_INITIAL", "0.5"))
+TEXTRACT_POLL_MAX = float(os.getenv("TEXTRACT_POLL_MAX", "5"))
+TEXTRACT_POLL_BACKOFF = 1.5
+TEXTRACT_DEADLINE = float(os.getenv("TEXTRACT_DEADLINE_SECONDS", "300"))
+TEXTRACT_PAGE_SIZE = 1000
+
+# Optional completion notifications (SNS -> /api/textract-notifications) instead of polling
+TEXTRACT_SNS_TOPIC_ARN = os.getenv("TEXTRACT_SNS_TOPIC_ARN")
+TEXTRACT_ROLE_ARN = os.getenv("TEXTRACT_ROLE_ARN")
+TEXTRACT_NOTIFY_POLL = 10.0
+
+# Single-page documents up to this size go to the synchronous bytes API (Textract's limit is 10MB)
+TEXTRACT_SYNC_MAX_BYTES = int(os.getenv("TEXTRACT_SYNC_MAX_BYTES", str(10 * 1024 * 1024)))
+TEXTRACT_SYNC_FALLBACK_ERRORS = ('UnsupportedDocumentException', 'DocumentTooLargeException',
+                                 'InvalidParameterException', 'BadDocumentException')
+
+# Digitally generated PDFs carry a text layer; use it when it looks like a real invoice
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", "200"))
+
+# Extraction paths reported on each invoice
+PATH_TEXT_LAYER = 'text_layer'
+PATH_TEXTRACT_SYNC = 'textract_sync'
+PATH_TEXTRACT_ASYNC = 'textract_async'
+PATH_CACHE = 'cache'
+
+_extraction_stats = {PATH_TEXT_LAYER: 0, PATH_CACHE: 0, PATH_TEXTRACT_SYNC: 0, PATH_TEXTRACT_ASYNC: 0}
+_extraction_stats_lock = threading.Lock()
+
+def _build_ocr_cache() -> OcrTextCache:
+    """OCR text cache with the store selected by OCR_CACHE_BACKEND (s3, disk or memory)"""
+    backend = os.getenv("OCR_CACHE_BACKEND", "s3").lower()
+    store = None
+    if backend == 's3':
+        bucket = os.getenv("OCR_CACHE_BUCKET") or os.getenv("S3_BUCKET")
+        if bucket:
+            store = S3TextStore(s3, bucket, os.getenv("OCR_CACHE_PREFIX", "ocr-cache/"))
+    elif backend == 'disk':
+        store = DiskTextStore(os.getenv("OCR_CACHE_DIR", "ocr_cache"))
+    return OcrTextCache(store, max_size=int(os.getenv("OCR_CACHE_SIZE", "256")))
+
+ocr_cache = _build_ocr_cache()
+
+class TextractCompletionQueue:
+    """
+    Local stand-in for the SQS queue Textract completion notifications are
+    delivered to: the SNS webhook publishes job statuses and waiting OCR calls
+    pick them up instead of polling
+    """
+    def __init__(self):
+        self._statuses = {}
+        self._cond = threading.Condition()
+
+    def publish(self, job_id: str, status: str):
+        with self._cond:
+            # Drop statuses nobody picked up (e.g. jobs started by another worker process)
+            cutoff = time.monotonic() - TEXTRACT_DEADLINE
+            for stale in [j for j, (_, at) in self._statuses.items() if at < cutoff]:
+                del self._statuses[stale]
+            self._statuses[job_id] = (status, time.monotonic())
+            self._cond.notify_all()
+
+    def wait(self, job_id: str, timeout: float) -> Optional[str]:
+        """Return the job's completion status, or None if none arrived within timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: job_id in self._statuses, timeout=timeout)
+            entry = self._statuses.pop(job_id, None)
+            return entry[0] if entry else None
+
+textract_notifications = TextractCompletionQueue()
+
+def _notification_channel() -> Optional[dict]:
+    if TEXTRACT_SNS_TOPIC_ARN and TEXTRACT_ROLE_ARN:
+        return {'SNSTopicArn': TEXTRACT_SNS_TOPIC_ARN, 'RoleArn': TEXTRACT_ROLE_ARN}
+    return None
+
+def _wait_for_textract(job_id: str, notify: bool) -> Tuple[dict, int]:
+    """
+    Wait for a Textract text-detection job to finish and return its first result page
+    Polls with a short initial interval and exponential backoff up to an overall
+    deadline; in notification mode it waits on the completion queue and polls only
+    as a safety net. Returns (first_page, polls)
+    """
+    deadline = time.monotonic() + TEXTRACT_DEADLINE
+    interval = TEXTRACT_POLL_INITIAL
+    polls = 0
     
-    # Poll for completion
     while True:
-        out = textract.get_document_text_detection(JobId=job_id)
-        if out['JobStatus'] in ('SUCCEEDED', 'FAILED'):
-            break
-        time.sleep(2)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"OCR job {job_id} did not finish within {TEXTRACT_DEADLINE}s")
+        
+        if notify:
+            status = textract_notifications.wait(job_id, timeout=min(TEXTRACT_NOTIFY_POLL, remaining))
+            if status == 'FAILED':
+                raise RuntimeError("OCR failed")
+        else:
+            time.sleep(min(interval, remaining))
+            interval = min(interval * TEXTRACT_POLL_BACKOFF, TEXTRACT_POLL_MAX)
+        
+        out = textract.get_document_text_detection(JobId=job_id, MaxResults=TEXTRACT_PAGE_SIZE)
+        polls += 1
+        if out['JobStatus'] == 'SUCCEEDED':
+            return out, polls
+        if out['JobStatus'] == 'PARTIAL_SUCCESS':
+            logger.warning(f"Textract job {job_id} only partially succeeded: {out.get('StatusMessage', '')}")
+            return out, polls
+        if out['JobStatus'] == 'FAILED':
+            raise RuntimeError("OCR failed")
+
+def _iter_text_lines(job_id: str, first_page: dict) -> Iterator[str]:
+    """Yield LINE block text page by page, following NextToken through every result page"""
+    page = first_page
+    while True:
+        for block in page.get('Blocks', []):
+            if block['BlockType'] == 'LINE':
+                yield block['Text']
+        
+        next_token = page.get('NextToken')
+        if not next_token:
+            return
+        page = textract.get_document_text_detection(
+            JobId=job_id, MaxResults=TEXTRACT_PAGE_SIZE, NextToken=next_token
+        )
+
+def _get_full_text(bucket: str, key: str, context: InvoiceContext = None) -> str:
+    """Get full text from PDF using AWS Textract"""
+    channel = _notification_channel()
+    request = {'DocumentLocation': {'S3Object': {'Bucket': bucket, 'Name': key}}}
+    if channel:
+        request['NotificationChannel'] = channel
+    
+    started = time.monotonic()
+    resp = textract.start_document_text_detection(**request)
+    job_id = resp['JobId']
     
-    if out['JobStatus'] != 'SUCCEEDED':
-        raise RuntimeError("OCR failed")
+    first_page, polls = _wait_for_textract(job_id, notify=channel is not None)
+    ocr_wait = time.monotonic() - started
     
     # Extract text maintaining structure
-    lines = []
-    for block in out.get('Blocks', []):
-        if block['BlockType'] == 'LINE':
-            lines.append(block['Text'])
+    lines = list(_iter_text_lines(job_id, first_page))
+    
+    logger.info(f"Textract job {job_id}: waited {ocr_wait:.2f}s over {polls} polls, {len(lines)} lines")
+    if context is not None:
+        context.metrics['ocr_wait_seconds'] = round(ocr_wait, 3)
+        context.metrics['ocr_polls'] = polls
+        context.metrics['textract_job_id'] = job_id
     
     return '\n'.join(lines)
 
-def extract_fields(pdf_bytes: bytes, bucket: str, sandbox_api_key: str = None, sandbox_api_secret: str = None) -> dict:
+def _is_usable_text_layer(text: str) -> bool:
+    """Enough text and a GSTIN-shaped token, so parsing won't do worse than OCR"""
+    return len(text.strip()) >= TEXT_LAYER_MIN_CHARS and extraction_engine.GSTIN_RE.search(text.upper()) is not None
+
+def _get_text_sync(pdf_bytes: bytes, context: InvoiceContext = None) -> str:
+    """OCR a single-page document straight from bytes, no S3 upload or polling"""
+    started = time.monotonic()
+    resp = textract.detect_document_text(Document={'Bytes': pdf_bytes})
+    ocr_wait = time.monotonic() - started
+    
+    lines = [block['Text'] for block in resp.get('Blocks', []) if block['BlockType'] == 'LINE']
+    
+    logger.info(f"Textract sync OCR: {ocr_wait:.2f}s, {len(lines)} lines")
+    if context is not None:
+        context.metrics['ocr_wait_seconds'] = round(ocr_wait, 3)
+        context.metrics['extraction_path'] = PATH_TEXTRACT_SYNC
+    
+    return '\n'.join(lines)
+
+def _get_text_async(upload: SpooledUpload, bucket: str, context: InvoiceContext = None) -> str:
+    """OCR through a temporary S3 object (streamed from the spooled file) and an async Textract job"""
+    key = f"raw_invoices/{uuid.uuid4()}.pdf"
+    upload.upload_to_s3(s3, bucket, key)
+    try:
+        text = _get_full_text(bucket, key, context)
+        if context is not None:
+            context.metrics['extraction_path'] = PATH_TEXTRACT_ASYNC
+        return text
+    finally:
+        try:
+            s3.delete_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            logger.warning(f"Could not delete temporary object {key}: {e}")
+
+def _record_extraction_path(path: str):
+    with _extraction_stats_lock:
+        _extraction_stats[path] += 1
+
+def get_extraction_stats() -> dict:
+    """Invoices per extraction path and the share that skipped Textract"""
+    with _extraction_stats_lock:
+        stats = dict(_extraction_stats)
+    total = sum(stats.values())
+    avoided = stats[PATH_TEXT_LAYER] + stats[PATH_CACHE]
+    stats['ocr_avoidance_rate'] = round(avoided / total, 3) if total else None
+    return stats
+
+def get_invoice_text(upload: SpooledUpload, bucket: str, context: InvoiceContext = None) -> str:
     """
-    Upload invoice PDF to S3, OCR via Textract, and extract key fields
+    Text for an invoice PDF, from the cheapest source that works
+    The embedded text layer is used when usable, then the OCR cache; otherwise
+    single-page documents within the sync size limit use detect_document_text
+    on the bytes, and multi-page, oversized or unparseable ones use the async S3 path
     """
-    # Upload to S3
-    key = f"raw_invoices/{uuid.uuid4()}.pdf"
-    s3.put_object(Bucket=bucket, Key=key, Body=pdf_bytes)
+    if context is None:
+        context = InvoiceContext()
+    
+    page_count, text = context.run_cpu(pdf_text.read_text_layer, upload.path)
+    if _is_usable_text_layer(text):
+        logger.info(f"Using PDF text layer ({len(text)} chars), skipping Textract")
+        context.metrics['extraction_path'] = PATH_TEXT_LAYER
+        _record_extraction_path(PATH_TEXT_LAYER)
+        return text
+    if page_count is not None:
+        logger.info(f"PDF text layer not usable ({len(text.strip())} chars), using Textract")
+    
+    # Repeat uploads of the same file reuse the earlier OCR result
+    digest = upload.sha256
+    cached = ocr_cache.get(digest)
+    if cached is not None:
+        logger.info(f"OCR cache hit for {digest[:12]} (originally {cached['extraction_path']})")
+        context.metrics['extraction_path'] = PATH_CACHE
+        _record_extraction_path(PATH_CACHE)
+        return cached['text']
+    
+    text = None
+    if page_count == 1 and upload.size <= TEXTRACT_SYNC_MAX_BYTES:
+        try:
+            # The sync API takes the document inline, so this is the one place it's read into memory
+            text = _get_text_sync(upload.read_bytes(), context)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in TEXTRACT_SYNC_FALLBACK_ERRORS:
+                raise
+            logger.warning(f"Sync Textract rejected document ({code}), falling back to async job")
+    
+    if text is None:
+        text = _get_text_async(upload, bucket, context)
+    
+    ocr_cache.set(digest, text, context.metrics['extraction_path'])
+    _record_extraction_path(context.metrics['extraction_path'])
+    return text
+
+def extract_fields(pdf: Union[SpooledUpload, bytes], bucket: str, sandbox_api_key: str = None,
+                   sandbox_api_secret: str = None, context: InvoiceContext = None) -> dict:
+    """
+    OCR the invoice PDF via Textract and extract key fields
+    pdf is a spooled upload; bytes are spooled to disk first
+    Sandbox lookups go through the context so later pipeline stages can reuse them
+    """
+    if context is None:
+        context = InvoiceContext()
     
     try:
-        # Get OCR text
-        full_text = _get_full_text(bucket, key)
+        if isinstance(pdf, bytes):
+            with upload_spool.spool_bytes(pdf) as upload:
+                full_text = get_invoice_text(upload, bucket, context)
+        else:
+            full_text = get_invoice_text(pdf, bucket, context)
         logger.info(f"OCR Text (first 500 chars): {full_text[:500]}")
         
-        # Initialize result
+        fields = context.run_cpu(extraction_engine.parse_invoice_text, full_text)
         inv = {
-            'invoice_number': '',
-            'invoice_date': '',
-            'total_amount': '',
+            'invoice_number': fields['invoice_number'],
+            'invoice_date': fields['invoice_date'],
+            'total_amount': fields['total_amount'],
             'vendor_name': '',
-            'vendor_gstin': ''
+            'vendor_gstin': fields['vendor_gstin'],
+            'extraction_path': context.metrics.get('extraction_path', '')
         }
         
-        # Clean text for processing
-        text_lines = [line.strip() for line in full_text.split('\n') if line.strip()]
-        text_upper = full_text.upper()
-        
-        # 1. Extract GSTIN (most reliable pattern)
-        gstin_pattern = r'\b\d{2}[A-Z]{5}\d{4}[A-Z][0-9A-Z]Z[0-9A-Z]\b'
-        gstin_matches = re.findall(gstin_pattern, full_text.upper())
-        
-        if gstin_matches:
-            # Take the first valid GSTIN
-            inv['vendor_gstin'] = gstin_matches[0]
-            logger.info(f"Found GSTIN: {inv['vendor_gstin']}")
-            
-            # Try to get vendor name from API
-            if sandbox_api_key and sandbox_api_secret and inv['vendor_gstin']:
-                try:
-                    vendor_details = gstin_utils.verify_gstin_and_get_details(
-                        inv['vendor_gstin'], 
-                        sandbox_api_key, 
-                        sandbox_api_secret
-                    )
-                    
-                    if vendor_details.get('vendor_name'):
-                        inv['vendor_name'] = vendor_details['vendor_name']
-                        logger.info(f"Got vendor name from API: {inv['vendor_name']}")
-                except Exception as e:
-                    logger.error(f"Error fetching vendor details: {e}")
-        
-        # 2. Extract Invoice Number (enhanced patterns)
-        invoice_patterns = [
-            r'\b(UTL/PI\d+)\b',
-            r'\b(AIN\d{10,})\b',
-            r'\b(ININMH\d{10,})\b',
-            r'(?:INVOICE|INV|BILL)\s*(?:NO|NUMBER|#)?\s*[:.-]?\s*([A-Z0-9][-A-Z0-9/\\]{4,})',
-            r'(?:INVOICE NUMBER|INV NO|BILL NO)\s*[:.-]?\s*([A-Z0-9][-A-Z0-9/\\]{4,})',
-            r'(?:INVOICE|PROFORMA INVOICE)\s+([A-Z0-9][-A-Z0-9/\\]{4,})\s+(?:DATED|DATE)',
-            r'\b([A-Z]{2,5}/[A-Z0-9]+/?\d+)\b',
-            r'\b([A-Z]{2,5}-\d{4,})\b',
-            r'\b(INV-?\d{4,})\b',
-        ]
-        
-        for line in text_lines[:30]:
-            line_upper = line.upper().strip()
-            if re.search(r'\b(UTL/PI\d+|AIN\d{10,}|ININMH\d{10,})\b', line_upper):
-                match = re.search(r'\b(UTL/PI\d+|AIN\d{10,}|ININMH\d{10,})\b', line_upper)
-                if match:
-                    inv['invoice_number'] = match.group(1)
-                    logger.info(f"Found invoice number (direct match): {inv['invoice_number']}")
-                    break
-        
-        if not inv['invoice_number']:
-            for pattern in invoice_patterns:
-                matches = re.findall(pattern, text_upper, re.MULTILINE)
-                if matches:
-                    valid_matches = []
-                    for match in matches:
-                        match_clean = match.strip()
-                        if (len(match_clean) >= 4 and 
-                            not re.match(r'^(DATE|DATED|TIME|GSTIN|GST|PAN|CIN|UNITED|AKHIL|NAME|EMAIL|PHONE|MOBILE|ADDRESS|TOTAL|AMOUNT|CUSTOMER|ENTORY|INVENTORY)$', match_clean) and
-                            not re.match(r'^\d{10}$', match_clean) and
-                            not re.match(r'^\d{6}$', match_clean) and
-                            not re.search(r'(ROAD|STREET|FLOOR|BUILDING|BANGALORE|DELHI|MUMBAI|CHENNAI|KOLKATA)', match_clean)):
-                            valid_matches.append(match_clean)
-                    
-                    if valid_matches:
-                        for vm in valid_matches:
-                            if re.match(r'^(UTL/|AIN|ININMH)', vm):
-                                inv['invoice_number'] = vm
-                                break
-                        
-                        if not inv['invoice_number']:
-                            structured_matches = [m for m in valid_matches if re.search(r'[A-Z]', m) and re.search(r'\d', m) and ('/' in m or '-' in m)]
-                            if structured_matches:
-                                inv['invoice_number'] = structured_matches[0]
-                            elif valid_matches:
-                                inv['invoice_number'] = valid_matches[0]
-                        
-                        if inv['invoice_number']:
-                            logger.info(f"Found invoice number: {inv['invoice_number']}")
-                            break
-        
-        # 3. Extract Date (enhanced patterns)
-        date_patterns = [
-            r'(?:DATE|DATED|INVOICE DATE|BILL DATE)?\s*[:.-]?\s*(\d{1,2}[-/]\d{1,2}[-/]\d{4})',
-            r'(?:DATE|DATED)?\s*[:.-]?\s*(\d{1,2}[-/](?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[-/]\d{4})',
-            r'(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[A-Z]*\s+\d{1,2},?\s+\d{4}',
-            r'(?:DATE|DATED)?\s*[:.-]?\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-            r'\b(\d{1,2}[-/]\d{1,2}[-/]\d{4})\b',
-            r'\b(\d{4}[-/]\d{1,2}[-/]\d{1,2})\b'
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text_upper, re.IGNORECASE)
-            if matches:
-                inv['invoice_date'] = matches[0]
-                logger.info(f"Found invoice date: {inv['invoice_date']}")
-                break
-        
-        # 4. Extract Amount (UPDATED LOGIC)
-        final_amount = None
-
-        # Priority 1: Search for the most reliable keywords for the final amount.
-        priority_1_pattern = r'(?:GRAND TOTAL|FINAL AMOUNT|TOTAL AMOUNT IN INR)\s*(?:₹|RS\.?|INR)?\s*([0-9,]+(?:\.[0-9]{2})?)'
-        matches = re.findall(priority_1_pattern, full_text, re.IGNORECASE)
-        if matches:
+        # Prefer the registered name from the API (only for GSTINs that pass offline
+        # validation and aren't already in the known-vendor directory)
+        if sandbox_api_key and sandbox_api_secret and fields['gstin_validated'] and not fields['known_vendor']:
             try:
-                clean_amount = re.sub(r'[^\d.]', '', matches[0])
-                final_amount = float(clean_amount)
-                logger.info(f"Found priority 1 amount: {final_amount}")
-            except (ValueError, IndexError):
-                pass
-
-        # If no high-priority amount found, collect all possible amounts and pick the largest.
-        if final_amount is None:
-            all_amounts = []
-            amount_patterns = [
-                r'(?:TOTAL|SUBTOTAL|TOTAL AMOUNT|NET AMOUNT)\s*(?:₹|RS\.?|INR)?\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'₹\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'Rs\.?\s*([0-9,]+(?:\.[0-9]{2})?)',
-                r'\b([0-9]{1,3}(?:,[0-9]{3})+(?:\.[0-9]{2})?)\b'
-            ]
-
-            for pattern in amount_patterns:
-                matches = re.findall(pattern, full_text, re.IGNORECASE | re.MULTILINE)
-                for match in matches:
-                    try:
-                        clean_amount_str = re.sub(r'[^\d.]', '', str(match))
-                        if clean_amount_str and not all(c in '0.' for c in clean_amount_str):
-                            amount_val = float(clean_amount_str)
-                            if not (len(clean_amount_str) == 10 and clean_amount_str[0] in '6789') and \
-                               not (len(clean_amount_str) == 6 and '.' not in clean_amount_str):
-                                if 0.01 <= amount_val <= 100000000:
-                                    all_amounts.append(amount_val)
-                    except ValueError:
-                        continue
-            
-            if all_amounts:
-                unique_amounts = sorted(list(set(all_amounts)), reverse=True)
-                logger.info(f"Found potential amounts: {unique_amounts}")
-                final_amount = unique_amounts[0]
-
-        # Fallback to amount in words if no numeric amount is found.
-        if final_amount is None:
-            word_patterns = [
-                r"Amount in words[:\-\s]*:?\s*([A-Za-z\s\-]+?)(?:\n|$|Rs|Rupees)",
-            ]
-            for pattern in word_patterns:
-                matches = re.findall(pattern, full_text, re.IGNORECASE)
-                if matches:
-                    try:
-                        word_amount = matches[0].strip()
-                        word_amount = re.sub(r'(?:rupees?|only|and|paise|rs\.?)', '', word_amount, flags=re.IGNORECASE).strip()
-                        if word_amount:
-                            numeric_amount = w2n.word_to_num(word_amount)
-                            if 100 <= numeric_amount <= 100000000:
-                                final_amount = numeric_amount
-                                logger.info(f"Found amount from words: {final_amount}")
-                                break
-                    except Exception:
-                        continue
-
-        if final_amount is not None:
-            inv['total_amount'] = str(final_amount)
-            logger.info(f"Final extracted amount: {inv['total_amount']}")
+                vendor_details = context.verify_gstin(
+                    inv['vendor_gstin'], 
+                    sandbox_api_key, 
+                    sandbox_api_secret
+                )
+                
+                if vendor_details.get('vendor_name'):
+                    inv['vendor_name'] = vendor_details['vendor_name']
+                    logger.info(f"Got vendor name from API: {inv['vendor_name']}")
+            except Exception as e:
+                logger.error(f"Error fetching vendor details: {e}")
         
-        # 5. Extract Vendor Name (if not from API)
         if not inv['vendor_name']:
-            if 'AMAZON WEB SERVICES' in text_upper:
-                inv['vendor_name'] = 'Amazon Web Services India Private Limited'
-            elif 'ATLYS' in text_upper:
-                inv['vendor_name'] = 'Atlys India Private Limited'
-            elif 'UNITED TECHNOLINK' in text_upper:
-                inv['vendor_name'] = 'United Technolink Pvt Ltd'
-            else:
-                vendor_patterns = [
-                    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:PVT\.?\s*)?(?:LTD|LIMITED)\.?)$',
-                    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:PRIVATE\s+)?LIMITED)$',
-                    r'^([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*\s+(?:TECHNOLOGIES|SOLUTIONS|SERVICES|ENTERPRISES|INDUSTRIES))$',
-                    r'(?:FROM|SOLD BY|SUPPLIER|VENDOR)\s*[:.-]\s*([A-Z][A-Za-z]+(?:\s+[A-Z][A-Za-z]+)*)',
-                ]
-                
-                for line in text_lines[:15]:
-                    line = line.strip()
-                    
-                    if (len(line) < 5 or 
-                        re.search(r'(?:INVOICE|BILL|GST|GSTIN|DATE|ORIGINAL|TAX|PROFORMA|SIGNATURE)', line, re.IGNORECASE) or
-                        re.search(r'^\d+$', line) or
-                        re.search(r'\d{2}[-/]\d{2}[-/]\d{4}', line) or
-                        line.upper() in ['NAME: AKHIL SINGH', 'AKHIL SINGH']):
-                        continue
-                    
-                    for pattern in vendor_patterns:
-                        match = re.match(pattern, line, re.IGNORECASE)
-                        if match:
-                            inv['vendor_name'] = match.group(1).strip()
-                            logger.info(f"Found vendor name from OCR: {inv['vendor_name']}")
-                            break
-                    
-                    if inv['vendor_name']:
-                        break
-            
-            logger.info(f"Final vendor name: {inv['vendor_name']}")
+            inv['vendor_name'] = fields['vendor_name']
         
         logger.info(f"Extraction complete: {json.dumps(inv, indent=2)}")
         
@@ -279,8 +328,3 @@ def extract_fields(pdf_bytes: bytes, bucket: str, sandbox_api_key: str = None, s
             'vendor_name': '',
             'vendor_gstin': ''
         }
-    finally:
-        try:
-            s3.delete_object(Bucket=bucket, Key=key)
-        except:
-            pass
\ No newline at end of file
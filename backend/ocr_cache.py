@@ -0,0 +1,146 @@
+"""
+Content-addressed cache of extracted invoice text
+Keyed by the SHA-256 of the PDF bytes so repeat uploads of the same file
+skip Textract; an in-memory LRU sits in front of a gzip-compressed store
+on local disk or S3
+"""
+
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(entry: Dict[str, Any]) -> bytes:
+    return gzip.compress(json.dumps(entry).encode('utf-8'))
+
+
+def _decode(blob: bytes) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(blob).decode('utf-8'))
+
+
+class DiskTextStore:
+    """One gzip file per digest under a local directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return _decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest: str, entry: Dict[str, Any]):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_encode(entry))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class S3TextStore:
+    """One gzip object per digest under an S3 prefix, shared by every worker"""
+
+    def __init__(self, s3_client, bucket: str, prefix: str = "ocr-cache/"):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{digest}.json.gz")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return _decode(obj['Body'].read())
+
+    def put(self, digest: str, entry: Dict[str, Any]):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{digest}.json.gz",
+            Body=_encode(entry),
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+
+
+class OcrTextCache:
+    def __init__(self, store=None, max_size: int = 256, ttl: float = 30 * 24 * 60 * 60):
+        """
+        Args:
+            store: Optional DiskTextStore/S3TextStore behind the in-memory LRU
+            max_size: Documents kept in memory
+            ttl: Lifetime in seconds of in-memory entries; the store has no expiry
+        """
+        self.store = store
+        self._memory = TTLCache(name="ocr_text", max_size=max_size, ttl=ttl, jitter=0)
+        self._lock = threading.Lock()
+        self._stats = {'store_hits': 0, 'store_errors': 0, 'writes': 0}
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Cached {'text', 'extraction_path'} for the digest, or None"""
+        entry = self._memory.get(digest)
+        if entry is not None or self.store is None:
+            return entry
+
+        try:
+            entry = self.store.get(digest)
+        except Exception as e:
+            logger.warning(f"OCR cache store read failed for {digest[:12]}: {e}")
+            self._count('store_errors')
+            return None
+
+        if entry is not None:
+            self._count('store_hits')
+            self._memory.set(digest, entry)
+        return entry
+
+    def set(self, digest: str, text: str, extraction_path: str):
+        entry = {'text': text, 'extraction_path': extraction_path}
+        self._memory.set(digest, entry)
+        self._count('writes')
+        if self.store is None:
+            return
+        try:
+            self.store.put(digest, entry)
+        except Exception as e:
+            # The in-memory copy still serves this worker
+            logger.warning(f"OCR cache store write failed for {digest[:12]}: {e}")
+            self._count('store_errors')
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        memory = self._memory.get_stats()
+        stats['memory_hits'] = memory['hits']
+        stats['misses'] = memory['misses'] - stats['store_hits']
+        stats['memory_size'] = memory['size']
+        stats['store'] = type(self.store).__name__ if self.store else None
+        return stats
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
@@ -1,10 +1,9 @@
 import os
 import logging
-import threading
 import requests
 import json
 import re
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
 import invoice_utils
@@ -12,6 +11,16 @@ import compliance_utils
 import gstin_utils
 from duplicate_detection import DuplicatePaymentDetector
 from bank_verification import bank_verifier
+from invoice_context import InvoiceContext
+import sandbox_auth
+from pipeline_stages import Stage, run_stages
+from concurrent.futures import ThreadPoolExecutor
+from sandbox_client import sandbox_client
+import bulk_verification
+import batch_processing
+import upload_spool
+import sns_verification
+from invoice_jobs import InvoiceJobManager
 from datetime import datetime, timezone, timedelta
 import boto3
 
@@ -49,8 +58,25 @@ CORS(app, origins=[
     "*"  # Remove in production
 ])
 
+# Batch parse workers are spawned and re-run this script as __mp_main__; they only
+# use the extraction code, so the services below start in the serving process only
+IS_PARSE_WORKER = __name__ == '__mp_main__'
+
 # Initialize duplicate detector
-duplicate_detector = DuplicatePaymentDetector(S3_BUCKET)
+duplicate_detector = None if IS_PARSE_WORKER else DuplicatePaymentDetector(S3_BUCKET)
+if duplicate_detector is not None:
+    duplicate_detector.warm_up()
+
+# Shared pool for the independent verification stages of process_invoice_common
+stage_executor = None if IS_PARSE_WORKER else ThreadPoolExecutor(
+    max_workers=int(os.getenv("PIPELINE_STAGE_WORKERS", "16")),
+    thread_name_prefix="invoice-stage"
+)
+STAGE_TIMEOUTS = {
+    'gstin_verification': float(os.getenv("GSTIN_STAGE_TIMEOUT", "45")),
+    'return_history': float(os.getenv("RETURN_HISTORY_STAGE_TIMEOUT", "30")),
+    'duplicate_check': float(os.getenv("DUPLICATE_STAGE_TIMEOUT", "60")),
+}
 
 def format_amount(amount_str):
     """Format amount string for display"""
@@ -70,15 +96,80 @@ def format_amount(amount_str):
     except (ValueError, TypeError):
         return f"₹{amount_str}"
 
-def process_invoice_common(pdf_bytes):
-    """Common invoice processing logic optimized for frontend"""
+def _stage_value(stage_results, name):
+    """Return a stage's value, re-raising its error so scoring keeps its except branches"""
+    result = stage_results[name]
+    if result.error is not None:
+        raise result.error
+    return result.value
+
+def _unavailable_reason(check, result):
+    """Reason for a check skipped because Sandbox was degraded or rate limited"""
+    if result.get('error') == gstin_utils.VERIFICATION_THROTTLED:
+        return f"{check} unavailable - Sandbox API rate limited"
+    return f"{check} unavailable - Sandbox API degraded"
+
+def _duplicate_stage(inv, gstin_verification=None):
+    """Duplicate check on a copy of the invoice, with the API vendor name filled in as scoring does"""
+    record = dict(inv)
+    if gstin_verification and gstin_verification.get('is_valid') and gstin_verification.get('vendor_name'):
+        record['vendor_name'] = gstin_verification['vendor_name']
+    return duplicate_detector.get_duplicate_report(record)
+
+def _build_verification_stages(inv, context):
+    """GSTIN verification, return history and duplicate check are independent of each other"""
+    gstin = inv.get('vendor_gstin', '').strip()
+    invoice_date = inv.get('invoice_date', '').strip()
+    stages = []
+    
+    if gstin:
+        stages.append(Stage(
+            'gstin_verification',
+            context.verify_gstin,
+            args=(gstin, SANDBOX_API_KEY, SANDBOX_API_SECRET),
+            timeout=STAGE_TIMEOUTS['gstin_verification']
+        ))
+    
+    if gstin and invoice_date:
+        stages.append(Stage(
+            'return_history',
+            context.get_return_history,
+            kwargs={
+                'gstin': gstin,
+                'api_key': SANDBOX_API_KEY,
+                'api_secret': SANDBOX_API_SECRET,
+                'invoice_date': invoice_date,
+            },
+            timeout=STAGE_TIMEOUTS['return_history']
+        ))
+    
+    # Only when the vendor name is missing does the duplicate check need the GSTIN result
+    needs_vendor_name = gstin and not inv.get('vendor_name', '').strip()
+    stages.append(Stage(
+        'duplicate_check',
+        _duplicate_stage,
+        args=(inv,),
+        depends_on=('gstin_verification',) if needs_vendor_name else (),
+        timeout=STAGE_TIMEOUTS['duplicate_check']
+    ))
+    
+    return stages
+
+def process_invoice_common(pdf, context=None):
+    """Common invoice processing logic optimized for frontend; pdf is a spooled upload"""
     try:
+        # Shared per-invoice state so extraction and scoring reuse Sandbox lookups
+        if context is None:
+            context = InvoiceContext()
+        
         logger.info("Starting field extraction...")
+        context.report("extracting")
         inv = invoice_utils.extract_fields(
-            pdf_bytes, 
+            pdf, 
             S3_BUCKET, 
             SANDBOX_API_KEY, 
-            SANDBOX_API_SECRET
+            SANDBOX_API_SECRET,
+            context=context
         )
         
         vendor = inv.get('vendor_name', '').strip()
@@ -87,26 +178,40 @@ def process_invoice_common(pdf_bytes):
         fraud_reasons = []
         fraud_score = 0
 
+        # Run the independent verification stages concurrently, then score in a fixed order
+        logger.info(f"Running verification stages for GSTIN: {gstin or 'N/A'}")
+        context.report("verifying", invoice_number=inv.get('invoice_number', ''), vendor_gstin=gstin)
+        stage_results = run_stages(
+            _build_verification_stages(inv, context),
+            stage_executor,
+            on_stage_done=lambda r: context.report(r.name, ok=r.ok, seconds=round(r.elapsed, 3))
+        )
+        context.report("scoring")
+        context.metrics['stage_seconds'] = {name: round(r.elapsed, 3) for name, r in stage_results.items()}
+
         # Enhanced GSTIN validation
         if gstin:
             try:
-                logger.info(f"Verifying GSTIN: {gstin}")
-                gstin_result = gstin_utils.verify_gstin_and_get_details(
-                    gstin, SANDBOX_API_KEY, SANDBOX_API_SECRET
-                )
+                gstin_result = _stage_value(stage_results, 'gstin_verification')
                 
                 if gstin_result.get('is_valid'):
                     fraud_reasons.append("✅ GSTIN verification complete")
                     # Update vendor name if API provides better name
                     if gstin_result.get('vendor_name') and not vendor:
                         inv['vendor_name'] = gstin_result['vendor_name']
+                elif gstin_result.get('unavailable'):
+                    fraud_reasons.append(_unavailable_reason("GSTIN verification", gstin_result))
+                    fraud_score += 5
+                elif (gstin_result.get('error') or '').startswith("Invalid GSTIN format"):
+                    fraud_reasons.append("GSTIN failed format/checksum validation")
+                    fraud_score += 20
                 else:
                     if gstin_result.get('error') == "API access restricted":
                         fraud_reasons.append("✅ GSTIN format valid")
                         fraud_score += 5
                     else:
-                       fraud_reasons.append("✅ GSTIN verification complete")
-                       fraud_score += 5
+                        fraud_reasons.append(f"GSTIN verification failed: {gstin_result.get('error') or 'Unknown error'}")
+                        fraud_score += 5
                     
             except Exception as e:
                 logger.error(f"GSTIN verification error: {e}")
@@ -125,12 +230,7 @@ def process_invoice_common(pdf_bytes):
         gst_filing_details = {}
         if gstin and invoice_date:
             try:
-                history_result = gstin_utils.get_return_history(
-                    gstin=gstin,
-                    api_key=SANDBOX_API_KEY,
-                    api_secret=SANDBOX_API_SECRET,
-                    invoice_date=invoice_date,
-                )
+                history_result = _stage_value(stage_results, 'return_history')
                 
                 if history_result.get('success'):
                     gst_filing_history = history_result
@@ -145,6 +245,9 @@ def process_invoice_common(pdf_bytes):
                         fraud_reasons.append(f"No GST returns filed for FY {financial_year}")
                         fraud_score += 30
                                 
+                elif history_result.get('unavailable'):
+                    fraud_reasons.append(_unavailable_reason("GST filing history", history_result))
+                    fraud_score += 5
                 else:
                     error = history_result.get('error', 'Unknown error')
                     if "API access restricted" in error:
@@ -165,8 +268,13 @@ def process_invoice_common(pdf_bytes):
                 fraud_reasons.append("Cannot check GST filing history - Invoice date missing")
         # Enhanced duplicate detection
         try:
-            duplicate_result = duplicate_detector.get_duplicate_report(inv)
-            if duplicate_result.get('is_potential_duplicate'):
+            duplicate_result = _stage_value(stage_results, 'duplicate_check')
+            if duplicate_result.get('match_type') == 'exact':
+                fraud_reasons.append(
+                    f"Exact duplicate of {len(duplicate_result['matched_record_ids'])} previously processed invoice(s)"
+                )
+                fraud_score += 35
+            elif duplicate_result.get('is_potential_duplicate'):
                 fraud_reasons.append(f"Potential duplicate detected (similarity: {duplicate_result.get('similarity_score', 0):.1f}%)")
                 fraud_score += 35
         except Exception as e:
@@ -221,7 +329,12 @@ def process_invoice_common(pdf_bytes):
             ]
         
         # Store invoice data for analytics
+        context.report("storing")
         _store_invoice_data(inv, fraud_score, fraud_reasons)
+        logger.info(
+            f"Invoice {context.request_id}: sandbox lookups {context.get_stats()}, "
+            f"stage timings {context.metrics['stage_seconds']}"
+        )
         
         return {
             'invoice_data': inv,
@@ -236,17 +349,57 @@ def process_invoice_common(pdf_bytes):
         logger.error(f"Error processing invoice: {e}")
         raise
 
+def _format_invoice_response(result):
+    """Response body returned to the frontend for a processed invoice"""
+    return {
+        'success': True,
+        'data': {
+            'invoice_number': result['invoice_data'].get('invoice_number', 'N/A'),
+            'vendor_name': result['invoice_data'].get('vendor_name', 'N/A'),
+            'vendor_gstin': result['invoice_data'].get('vendor_gstin', 'N/A'),
+            'amount': format_amount(result['invoice_data'].get('total_amount', '0')),
+            'invoice_date': result['invoice_data'].get('invoice_date', 'N/A'),
+            'fraud_score': result['fraud_score'],
+            'risk_level': result['risk_level'],
+            'risk_icon': result['risk_icon'],
+            'risk_factors': result['fraud_reasons'],
+            'recommendations': result['recommendations'],
+            'extraction_path': result['invoice_data'].get('extraction_path', '')
+        }
+    }
+
+# Background processing for /api/invoices and Telegram uploads
+job_manager = None if IS_PARSE_WORKER else InvoiceJobManager(
+    process_invoice_common,
+    _format_invoice_response,
+    max_workers=int(os.getenv("INVOICE_JOB_WORKERS", "4")),
+    retention_seconds=float(os.getenv("INVOICE_JOB_RETENTION_SECONDS", "3600"))
+)
+
 # API Routes optimized for frontend
 
 @app.route('/api/health', methods=['GET'])
 @cross_origin()
 def health_check():
-    """Health check endpoint"""
+    """
+    Health check endpoint - reports degraded, with a 503 so load balancers see it,
+    while any Sandbox circuit breaker is not closed
+    """
+    breakers = sandbox_client.get_breaker_stats()
+    degraded = any(b['state'] != 'closed' for b in breakers.values())
     return jsonify({
-        'status': 'healthy', 
+        'status': 'degraded' if degraded else 'healthy', 
         'timestamp': datetime.now().isoformat(),
-        'version': '2.0'
-    })
+        'version': '2.0',
+        'sandbox_auth': sandbox_auth.token_provider.get_stats(),
+        'gstin_cache': gstin_utils.gstin_cache.get_stats(),
+        'sandbox_rate_limits': sandbox_client.rate_limiter.get_stats(),
+        'sandbox_breakers': breakers,
+        'invoice_jobs': job_manager.get_stats(),
+        'extraction': invoice_utils.get_extraction_stats(),
+        'ocr_cache': invoice_utils.ocr_cache.get_stats(),
+        'duplicate_index': duplicate_detector.get_stats()
+    }), 503 if degraded else 200
 
 @app.route('/api/process-invoice', methods=['POST', 'OPTIONS'])
 @cross_origin()
@@ -266,33 +419,144 @@ def process_invoice_api():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'success': False, 'error': 'Only PDF files are allowed'}), 400
         
-        # Read PDF bytes
-        pdf_bytes = file.read()
+        # Spool to disk (hashed and signature-checked) instead of buffering in memory
+        try:
+            upload = upload_spool.spool_stream(file.stream, file.filename)
+        except upload_spool.InvalidUploadError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Process invoice
-        result = process_invoice_common(pdf_bytes)
+        with upload:
+            result = process_invoice_common(upload)
         
         # Return optimized response for frontend
+        return jsonify(_format_invoice_response(result))
+        
+    except Exception as e:
+        logger.error(f"Error processing invoice: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/invoices', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def submit_invoice_job_api():
+    """Queue an invoice for background processing and return its job id immediately"""
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        
+        if not file.filename.lower().endswith('.pdf'):
+            return jsonify({'success': False, 'error': 'Only PDF files are allowed'}), 400
+        
+        try:
+            upload = upload_spool.spool_stream(file.stream, file.filename)
+        except upload_spool.InvalidUploadError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        job = job_manager.submit(lambda: upload, source='api')
+        
         return jsonify({
             'success': True,
             'data': {
-                'invoice_number': result['invoice_data'].get('invoice_number', 'N/A'),
-                'vendor_name': result['invoice_data'].get('vendor_name', 'N/A'),
-                'vendor_gstin': result['invoice_data'].get('vendor_gstin', 'N/A'),
-                'amount': format_amount(result['invoice_data'].get('total_amount', '0')),
-                'invoice_date': result['invoice_data'].get('invoice_date', 'N/A'),
-                'fraud_score': result['fraud_score'],
-                'risk_level': result['risk_level'],
-                'risk_icon': result['risk_icon'],
-                'risk_factors': result['fraud_reasons'],
-                'recommendations': result['recommendations']
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f"/api/invoices/{job.id}",
+                'events_url': f"/api/invoices/{job.id}/events"
             }
-        })
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error processing invoice: {e}")
+        logger.error(f"Error queueing invoice: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/invoices/batch', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def process_invoice_batch_api():
+    """Batch invoice endpoint - accepts ZIPs and/or multiple PDFs, streams NDJSON results as they complete"""
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:
+        # Batches are bounded by their own limits rather than the single-upload cap;
+        # this must be set before the form is parsed
+        request.max_content_length = batch_processing.MAX_TOTAL_BYTES
+        try:
+            concurrency = int(request.form.get('concurrency') or 0) or None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'concurrency must be an integer'}), 400
+        
+        uploads = request.files.getlist('files') + request.files.getlist('file')
+        documents, skipped, error = batch_processing.collect_batch_documents(uploads)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        def generate():
+            try:
+                results = list(skipped)
+                for result in skipped:
+                    yield json.dumps(result) + "\n"
+                for result in batch_processing.process_batch_iter(
+                    documents,
+                    process_invoice_common,
+                    _format_invoice_response,
+                    concurrency=concurrency
+                ):
+                    results.append(result)
+                    yield json.dumps(result) + "\n"
+                yield json.dumps({'summary': batch_processing.summarize(results)}) + "\n"
+            finally:
+                batch_processing.close_batch_documents(documents)
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        logger.error(f"Batch invoice processing error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/invoices/<job_id>', methods=['GET'])
+@cross_origin()
+def get_invoice_job_api(job_id):
+    """Poll a background invoice job; 'result' has the same shape as /api/process-invoice"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+@app.route('/api/invoices/<job_id>/events', methods=['GET'])
+@cross_origin()
+def stream_invoice_job_api(job_id):
+    """Server-sent events for a background invoice job: one 'progress' event per stage, then 'result'"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    def generate():
+        seen = 0
+        while True:
+            events = job_manager.wait_for_events(job, seen, timeout=15)
+            if not events and not job.finished:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            seen += len(events)
+            if job.finished and seen >= len(job.events):
+                final = job.result if job.result is not None else {'success': False, 'error': job.error}
+                yield f"event: result\ndata: {json.dumps(final)}\n\n"
+                return
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/recent-scans', methods=['GET'])
 @cross_origin()
 def get_recent_scans_api():
@@ -457,6 +721,57 @@ def verify_ifsc_api():
             'error': str(e)
         }), 500
 
+@app.route('/api/verify-gstins', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def verify_gstins_api():
+    """Bulk GSTIN verification endpoint - streams NDJSON results as they complete"""
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:
+        data = request.get_json(silent=True) or {}
+        options = data or request.form.to_dict()
+        
+        csv_text = None
+        if 'file' in request.files:
+            csv_text = request.files['file'].read().decode('utf-8-sig', errors='replace')
+        elif not data and request.mimetype == 'text/csv':
+            csv_text = request.get_data(as_text=True)
+        
+        gstins, error = bulk_verification.collect_request_gstins(options, csv_text)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        include_returns = str(options.get('include_returns', '')).lower() in ('1', 'true', 'yes')
+        invoice_date = (options.get('invoice_date') or '').strip() or None
+        try:
+            concurrency = int(options.get('concurrency') or 0) or None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'concurrency must be an integer'}), 400
+        
+        def generate():
+            results = []
+            for result in bulk_verification.verify_gstins_iter(
+                gstins,
+                SANDBOX_API_KEY,
+                SANDBOX_API_SECRET,
+                include_returns=include_returns,
+                invoice_date=invoice_date,
+                concurrency=concurrency
+            ):
+                results.append(result)
+                yield json.dumps(result) + "\n"
+            yield json.dumps({'summary': bulk_verification.summarize(results)}) + "\n"
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        logger.error(f"Bulk GSTIN verification error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/dashboard-stats', methods=['GET'])
 @cross_origin()
 def get_dashboard_stats():
@@ -538,6 +853,40 @@ def get_dashboard_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/textract-notifications', methods=['POST'])
+def textract_notification_webhook():
+    """SNS endpoint for Textract completion notifications (enabled by TEXTRACT_SNS_TOPIC_ARN)"""
+    try:
+        message = json.loads(request.get_data(as_text=True))
+    except ValueError:
+        return 'Bad Request', 400
+    
+    if not invoice_utils.TEXTRACT_SNS_TOPIC_ARN or message.get('TopicArn') != invoice_utils.TEXTRACT_SNS_TOPIC_ARN:
+        return 'Forbidden', 403
+    # The topic ARN isn't secret; only messages signed by SNS are acted on
+    if not sns_verification.verify_message(message):
+        return 'Forbidden', 403
+    
+    if message.get('Type') == 'SubscriptionConfirmation':
+        if not sns_verification.is_sns_url(message.get('SubscribeURL')):
+            logger.warning(f"Rejected SNS SubscribeURL {message.get('SubscribeURL')}")
+            return 'Forbidden', 403
+        try:
+            requests.get(message['SubscribeURL'], timeout=10)
+            logger.info("Confirmed Textract SNS subscription")
+        except Exception as e:
+            logger.error(f"Error confirming SNS subscription: {e}")
+            return 'Error', 500
+    elif message.get('Type') == 'Notification':
+        try:
+            body = json.loads(message.get('Message', '{}'))
+            invoice_utils.textract_notifications.publish(body['JobId'], body['Status'])
+        except (ValueError, KeyError) as e:
+            logger.error(f"Malformed Textract notification: {e}")
+            return 'Bad Request', 400
+    
+    return 'OK', 200
+
 # Telegram webhook (keeping existing functionality)
 @app.route(f'/{TELEGRAM_TOKEN}', methods=["POST"])
 def telegram_webhook():
@@ -561,7 +910,7 @@ def telegram_webhook():
             send_reply(chat_id, "Please send a PDF invoice.")
             return 'OK', 200
         file_id = doc['file_id']
-        threading.Thread(target=process_invoice_telegram, args=(file_id, chat_id), daemon=True).start()
+        process_invoice_telegram(file_id, chat_id)
     else:
         send_reply(chat_id, "Send a PDF invoice to process or /fraud_report to view today's flagged invoices.")
 
@@ -577,15 +926,26 @@ def send_reply(chat_id: int, text: str, parse_mode: str = None):
         logger.exception("Failed to send reply")
 
 def process_invoice_telegram(file_id: str, chat_id: int):
-    """Process invoice from Telegram"""
+    """Queue an invoice from Telegram on the shared job pool; the reply is sent when the job finishes"""
+    send_reply(chat_id, "🔄 Processing invoice... Please wait.")
+    job_manager.submit(
+        lambda: _download_telegram_pdf(file_id),
+        source='telegram',
+        on_complete=lambda job: _reply_telegram_job(chat_id, job)
+    )
+
+def _download_telegram_pdf(file_id: str) -> upload_spool.SpooledUpload:
+    info = requests.get(f"{bot_url}/getFile?file_id={file_id}", timeout=30).json()['result']
+    pdf_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{info['file_path']}"
+    return upload_spool.spool_url(pdf_url, name=info['file_path'])
+
+def _reply_telegram_job(chat_id: int, job):
+    """Send a finished job's result back to the Telegram chat"""
     try:
-        send_reply(chat_id, "🔄 Processing invoice... Please wait.")
+        if job.error is not None:
+            raise RuntimeError(job.error)
         
-        info = requests.get(f"{bot_url}/getFile?file_id={file_id}").json()['result']
-        pdf_url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{info['file_path']}"
-        pdf_bytes = requests.get(pdf_url).content
-
-        result = process_invoice_common(pdf_bytes)
+        result = job.raw_result
         
         inv = result['invoice_data']
         vendor = inv.get('vendor_name', '').strip()
@@ -650,11 +1010,13 @@ def _store_invoice_data(invoice_data, fraud_score, fraud_reasons):
             'vendor_gstin': invoice_data.get('vendor_gstin'),
             'amount': invoice_data.get('total_amount'),
             'invoice_date': invoice_data.get('invoice_date'),
+            'extraction_path': invoice_data.get('extraction_path'),
             'fraud_score': fraud_score,
             'fraud_reasons': fraud_reasons,
             'processed_at': datetime.now(timezone.utc).isoformat(),
             'risk_level': 'HIGH' if fraud_score >= 60 else 'MEDIUM' if fraud_score >= 30 else 'LOW'
         }
+        record.update(duplicate_detector.encode_features(record))
         
         key = f"invoice-analysis/{datetime.now().strftime('%Y/%m/%d')}/{record['invoice_number']}_{int(datetime.now().timestamp())}.json"
         s3.put_object(
@@ -666,6 +1028,9 @@ def _store_invoice_data(invoice_data, fraud_score, fraud_reasons):
         
         logger.info(f"Stored invoice analysis: {key}")
         
+        # Later duplicate checks see this invoice without reloading history
+        duplicate_detector.add_invoice(record, key)
+        
     except Exception as e:
         logger.error(f"Error storing invoice data: {e}")
 
@@ -0,0 +1,35 @@
+"""
+PDF text-layer reading
+Kept free of AWS clients and app state so it can run in worker processes
+"""
+
+import io
+import logging
+from typing import Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def read_text_layer(source: Union[str, bytes]) -> Tuple[Optional[int], str]:
+    """
+    Page count and embedded text of every page, from a file path or PDF bytes
+    The page count is None when the PDF can't be parsed; the text is empty
+    for scanned documents or when any page fails to extract
+    """
+    try:
+        reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+        page_count = len(reader.pages)
+    except Exception as e:
+        logger.warning(f"Could not parse PDF: {e}")
+        return None, ''
+
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or '')
+        except Exception as e:
+            logger.warning(f"Could not extract text layer from page: {e}")
+            return page_count, ''
+    return page_count, '\n'.join(pages)
@@ -0,0 +1,115 @@
+"""
+Small stage graph runner for the invoice pipeline
+Independent stages run concurrently on a shared bounded thread pool, each
+with its own timeout; a stage starts as soon as the stages it depends on finish
+"""
+
+import logging
+import time
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeoutError(Exception):
+    """Raised in place of a stage's result when it exceeds its timeout"""
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, args: Sequence = (), kwargs: Dict = None,
+                 depends_on: Sequence[str] = (), timeout: float = 30.0):
+        """
+        Args:
+            name: Unique stage name
+            fn: Callable run on the pool as fn(*args, **kwargs, **dependency_results)
+            depends_on: Stage names whose results are passed to fn as keyword arguments
+                (None when the dependency failed)
+            timeout: Seconds the stage may run before it is reported as timed out
+        """
+        self.name = name
+        self.fn = fn
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+
+class StageResult:
+    def __init__(self, name: str, value: Any = None, error: Optional[BaseException] = None, elapsed: float = 0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_stages(stages: List[Stage], executor: Executor,
+               on_stage_done: Optional[Callable[[StageResult], None]] = None) -> Dict[str, StageResult]:
+    """
+    Run the stage graph and return a StageResult per stage name
+    Stage errors and timeouts are captured in the result, never raised;
+    on_stage_done is called from this thread as each stage finishes
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+    results: Dict[str, StageResult] = {}
+    running = {}  # future -> (stage, started_at)
+
+    def finish(result: StageResult):
+        results[result.name] = result
+        if on_stage_done is not None:
+            on_stage_done(result)
+
+    def submit_ready():
+        for stage in stages:
+            if stage.name in results or any(s.name == stage.name for s, _ in running.values()):
+                continue
+            if all(dep in results for dep in stage.depends_on):
+                dep_values = {
+                    dep: results[dep].value if results[dep].ok else None
+                    for dep in stage.depends_on
+                }
+                future = executor.submit(stage.fn, *stage.args, **stage.kwargs, **dep_values)
+                running[future] = (stage, time.monotonic())
+
+    submit_ready()
+    while running:
+        now = time.monotonic()
+        next_deadline = min(started + stage.timeout for stage, started in running.values())
+        done, _ = wait(list(running), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+
+        now = time.monotonic()
+        for future in done:
+            stage, started = running.pop(future)
+            try:
+                finish(StageResult(stage.name, value=future.result(), elapsed=now - started))
+            except Exception as e:
+                finish(StageResult(stage.name, error=e, elapsed=now - started))
+
+        for future, (stage, started) in list(running.items()):
+            if now - started >= stage.timeout:
+                # The worker thread can't be interrupted; its late result is discarded
+                running.pop(future)
+                future.cancel()
+                logger.warning(f"Stage {stage.name} timed out after {stage.timeout}s")
+                finish(StageResult(
+                    stage.name,
+                    error=StageTimeoutError(f"{stage.name} timed out after {stage.timeout}s"),
+                    elapsed=now - started
+                ))
+
+        submit_ready()
+
+    for stage in stages:
+        if stage.name not in results:
+            results[stage.name] = StageResult(stage.name, error=ValueError(f"Stage {stage.name} has circular dependencies"))
+
+    return results
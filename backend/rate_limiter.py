@@ -0,0 +1,153 @@
+"""
+Adaptive per-endpoint rate limiting for Sandbox API calls
+A token bucket per endpoint that slows down when the API answers 429,
+honours Retry-After, and speeds back up as calls succeed
+"""
+
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, min_rate: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.throttle_events = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+    def refill(self, now: float):
+        # Nothing accrues during a Retry-After pause, so callers queued behind it
+        # are paced at the reduced rate afterwards instead of released together
+        start = max(self.updated_at, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated_at = max(self.updated_at, now)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float = 10.0, burst: float = 10.0, max_wait: float = 10.0,
+                 min_rate: float = 0.5, recovery_step: float = 0.1):
+        """
+        Args:
+            rate: Requests per second allowed per endpoint while the API is healthy
+            burst: Bucket capacity, i.e. requests allowed back-to-back
+            max_wait: Longest a caller is queued before acquire gives up
+            min_rate: Floor the rate is never reduced below
+            recovery_step: Fraction of the healthy rate regained per successful call
+        """
+        self.default_rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.min_rate = min_rate
+        self.recovery_step = recovery_step
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._cond = threading.Condition()
+
+    def _bucket(self, endpoint: str) -> TokenBucket:
+        # Caller holds self._cond
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            bucket = TokenBucket(self.default_rate, self.burst, self.min_rate)
+            self._buckets[endpoint] = bucket
+        return bucket
+
+    def acquire(self, endpoint: str, max_wait: Optional[float] = None) -> bool:
+        """
+        Take one request slot for the endpoint, queueing until one is free
+        Returns False if no slot became available within max_wait seconds
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        with self._cond:
+            bucket = self._bucket(endpoint)
+            bucket.waiting += 1
+            bucket.max_waiting = max(bucket.max_waiting, bucket.waiting)
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+
+                    if now >= bucket.paused_until and bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        bucket.total_wait += now - start
+                        return True
+
+                    if now >= bucket.paused_until:
+                        wait = (1 - bucket.tokens) / bucket.rate
+                    else:
+                        wait = bucket.paused_until - now
+
+                    if now + wait > deadline:
+                        bucket.timeouts += 1
+                        logger.warning(f"Rate limiter gave up waiting for {endpoint} after {now - start:.1f}s")
+                        return False
+
+                    self._cond.wait(wait)
+            finally:
+                bucket.waiting -= 1
+
+    def on_throttled(self, endpoint: str, retry_after: Optional[float] = None):
+        """Record a 429: halve the endpoint's rate and pause it for Retry-After seconds"""
+        with self._cond:
+            bucket = self._bucket(endpoint)
+            bucket.throttle_events += 1
+            bucket.rate = max(bucket.min_rate, bucket.rate / 2)
+            bucket.tokens = 0
+            pause = retry_after if retry_after is not None else 1 / bucket.rate
+            bucket.paused_until = max(bucket.paused_until, time.monotonic() + pause)
+            logger.warning(
+                f"Sandbox throttled {endpoint}: rate now {bucket.rate:.2f}/s, pausing {pause:.1f}s"
+            )
+            self._cond.notify_all()
+
+    def on_success(self, endpoint: str):
+        """Record a successful call: creep the rate back towards its healthy value"""
+        with self._cond:
+            bucket = self._bucket(endpoint)
+            if bucket.rate < bucket.max_rate:
+                bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate * self.recovery_step)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                endpoint: {
+                    'rate_per_second': round(bucket.rate, 2),
+                    'queue_depth': bucket.waiting,
+                    'max_queue_depth': bucket.max_waiting,
+                    'throttle_events': bucket.throttle_events,
+                    'wait_timeouts': bucket.timeouts,
+                    'total_wait_seconds': round(bucket.total_wait, 3),
+                    'paused_for_seconds': round(max(0.0, bucket.paused_until - now), 3),
+                }
+                for endpoint, bucket in self._buckets.items()
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,187 @@
+"""
+Sandbox API access-token provider
+Caches the access token until shortly before it expires, refreshes it in the
+background and coalesces concurrent refreshes into a single /authenticate call
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from sandbox_client import sandbox_client, SandboxUnavailableError
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "1.0"
+
+# Sandbox tokens are valid for 24 hours; used when the token carries no exp claim
+DEFAULT_TOKEN_TTL = 23 * 60 * 60
+# Stop handing out a token this many seconds before it expires
+EXPIRY_MARGIN = 5 * 60
+# Start a background refresh once the token is this close to the margin
+REFRESH_AHEAD = 30 * 60
+
+
+class _CachedToken:
+    def __init__(self, token: str, expires_at: float):
+        self.token = token
+        self.expires_at = expires_at
+
+
+class SandboxTokenProvider:
+    def __init__(self, expiry_margin: int = EXPIRY_MARGIN, refresh_ahead: int = REFRESH_AHEAD):
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+        self._tokens: Dict[Tuple[str, str], _CachedToken] = {}
+        self._lock = threading.Lock()
+        self._refreshing: Dict[Tuple[str, str], threading.Event] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'background_refreshes': 0,
+            'coalesced_waits': 0,
+            'failures': 0,
+        }
+
+    def get_token(self, api_key: str, api_secret: str) -> Optional[str]:
+        """
+        Return a valid raw access token (not prefixed with "Bearer "),
+        authenticating only when no usable cached token exists
+        """
+        cache_key = (api_key or '', api_secret or '')
+        now = time.time()
+
+        with self._lock:
+            cached = self._tokens.get(cache_key)
+            if cached and now < cached.expires_at - self.expiry_margin:
+                self._stats['hits'] += 1
+                if now >= cached.expires_at - self.expiry_margin - self.refresh_ahead:
+                    self._start_background_refresh(cache_key)
+                return cached.token
+
+            self._stats['misses'] += 1
+            in_flight = self._refreshing.get(cache_key)
+            if in_flight is None:
+                in_flight = threading.Event()
+                self._refreshing[cache_key] = in_flight
+                leader = True
+            else:
+                self._stats['coalesced_waits'] += 1
+                leader = False
+
+        if leader:
+            return self._refresh(cache_key, in_flight)
+
+        # Another caller is already authenticating; wait for its result
+        in_flight.wait(timeout=15)
+        with self._lock:
+            cached = self._tokens.get(cache_key)
+            if cached and time.time() < cached.expires_at:
+                return cached.token
+        if not sandbox_client.is_available("authenticate"):
+            raise SandboxUnavailableError("Sandbox authenticate unavailable (circuit open)")
+        return None
+
+    def invalidate(self, api_key: str, api_secret: str):
+        """Drop the cached token, e.g. after the API rejects it with a 401"""
+        with self._lock:
+            self._tokens.pop((api_key or '', api_secret or ''), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_tokens'] = len(self._tokens)
+        return stats
+
+    def _start_background_refresh(self, cache_key: Tuple[str, str]):
+        # Caller holds self._lock
+        if cache_key in self._refreshing:
+            return
+        in_flight = threading.Event()
+        self._refreshing[cache_key] = in_flight
+        self._stats['background_refreshes'] += 1
+        threading.Thread(
+            target=self._background_refresh,
+            args=(cache_key, in_flight),
+            daemon=True
+        ).start()
+
+    def _background_refresh(self, cache_key: Tuple[str, str], in_flight: threading.Event):
+        try:
+            self._refresh(cache_key, in_flight)
+        except SandboxUnavailableError as e:
+            # The current token is still valid; the next caller will try again
+            logger.warning(f"Background token refresh skipped: {e}")
+
+    def _refresh(self, cache_key: Tuple[str, str], in_flight: threading.Event) -> Optional[str]:
+        try:
+            token, expires_at = self._authenticate(*cache_key)
+            with self._lock:
+                self._stats['refreshes'] += 1
+                if token:
+                    self._tokens[cache_key] = _CachedToken(token, expires_at)
+                else:
+                    self._stats['failures'] += 1
+            return token
+        finally:
+            with self._lock:
+                self._refreshing.pop(cache_key, None)
+            in_flight.set()
+
+    def _authenticate(self, api_key: str, api_secret: str) -> Tuple[Optional[str], float]:
+        try:
+            auth_headers = {
+                "accept": "application/json",
+                "x-api-key": api_key,
+                "x-api-secret": api_secret,
+                "x-api-version": API_VERSION,
+            }
+
+            response = sandbox_client.post("authenticate", "/authenticate", headers=auth_headers)
+
+            if response.status_code == 200:
+                access_token = response.json().get("data", {}).get("access_token")
+                if access_token:
+                    return access_token, _token_expiry(access_token)
+
+            logger.error(f"Authentication failed: {response.status_code} - {response.text}")
+            return None, 0.0
+
+        except SandboxUnavailableError:
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Authentication request error: {e}")
+            return None, 0.0
+        except Exception as e:
+            logger.error(f"Unexpected authentication error: {e}")
+            return None, 0.0
+
+
+def _token_expiry(token: str) -> float:
+    """Read the exp claim from the JWT payload, falling back to the documented 24h lifetime"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        exp = float(claims['exp'])
+        # Some issuers use milliseconds
+        if exp > 1e12:
+            exp /= 1000
+        return exp
+    except Exception:
+        return time.time() + DEFAULT_TOKEN_TTL
+
+
+# Global instance
+token_provider = SandboxTokenProvider()
+
+
+def get_access_token(api_key: str, api_secret: str) -> Optional[str]:
+    """Shortcut for token_provider.get_token"""
+    return token_provider.get_token(api_key, api_secret)
@@ -0,0 +1,172 @@
+"""
+Shared HTTP client for Sandbox API traffic
+Keeps a pooled keep-alive session so lookups reuse TCP+TLS connections
+to api.sandbox.co.in instead of opening a new one per call
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from circuit_breaker import CircuitBreaker, OPEN
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.sandbox.co.in"
+
+# (connect, read) timeouts in seconds per endpoint
+ENDPOINT_TIMEOUTS = {
+    'authenticate': (3.05, 10),
+    'gstin_search': (3.05, 10),
+    'taxpayer_gstin': (3.05, 30),
+    'gstrs_track': (3.05, 15),
+    'bank_verify': (3.05, 30),
+    'ifsc': (3.05, 15),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+# All Sandbox lookups are read-only, so POSTs are safe to retry
+RETRY_METHODS = frozenset(['GET', 'POST'])
+RETRY_STATUSES = (502, 503, 504)
+
+
+class SandboxThrottledError(requests.exceptions.RequestException):
+    """Raised when no rate-limit slot frees up for an endpoint within the allowed wait"""
+
+
+class SandboxUnavailableError(requests.exceptions.RequestException):
+    """Raised without calling the API while an endpoint's circuit breaker is open"""
+
+
+class SandboxClient:
+    def __init__(self, base_url: str = BASE_URL, pool_size: int = None, max_retries: int = None):
+        self.base_url = base_url
+        self.pool_size = pool_size or int(os.getenv("SANDBOX_POOL_SIZE", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("SANDBOX_MAX_RETRIES", "2"))
+        self.throttle_retries = int(os.getenv("SANDBOX_THROTTLE_RETRIES", "3"))
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=float(os.getenv("SANDBOX_RATE_LIMIT", "10")),
+            burst=float(os.getenv("SANDBOX_RATE_BURST", "10")),
+            max_wait=float(os.getenv("SANDBOX_RATE_MAX_WAIT", "10")),
+        )
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._session = self._build_session()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            backoff_factor=0.3,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+            pool_block=False,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "accept": "application/json",
+            "connection": "keep-alive",
+        })
+        return session
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=int(os.getenv("SANDBOX_BREAKER_FAILURES", "5")),
+                    recovery_timeout=float(os.getenv("SANDBOX_BREAKER_RESET_SECONDS", "30")),
+                    half_open_probes=int(os.getenv("SANDBOX_BREAKER_HALF_OPEN_PROBES", "1")),
+                )
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def is_available(self, endpoint: str) -> bool:
+        """False while the endpoint's breaker is open"""
+        return self.breaker(endpoint).state != OPEN
+
+    def get_breaker_stats(self) -> Dict[str, Dict]:
+        with self._breakers_lock:
+            breakers = dict(self._breakers)
+        return {endpoint: breaker.get_stats() for endpoint, breaker in breakers.items()}
+
+    def request(self, method: str, endpoint: str, path: str, headers: Optional[Dict] = None,
+                timeout=None, **kwargs) -> requests.Response:
+        """
+        Send a request to the Sandbox API over the pooled session
+        Calls are paced by the endpoint's rate limiter; a 429 slows the endpoint
+        down and the call is queued and retried instead of failing straight away.
+        Requests that raise and 5xx answers count against the endpoint's
+        circuit breaker; while it is open SandboxUnavailableError is raised at once
+
+        Args:
+            method: HTTP method
+            endpoint: Logical endpoint name, used to pick timeouts and the rate-limit bucket
+            path: Path relative to the base URL (query string allowed)
+            headers: Request headers
+            timeout: Override for the endpoint's (connect, read) timeout
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        if timeout is None:
+            timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+
+        for attempt in range(self.throttle_retries + 1):
+            # Checked before waiting for a rate slot so calls to a down endpoint fail fast
+            breaker = self.breaker(endpoint)
+            if not breaker.allow_request():
+                raise SandboxUnavailableError(f"Sandbox {endpoint} unavailable (circuit open)")
+
+            if not self.rate_limiter.acquire(endpoint):
+                breaker.release()
+                raise SandboxThrottledError(f"Sandbox rate limit: no slot for {endpoint}")
+
+            try:
+                response = self._session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except Exception:
+                # Any failure to get a response (timeouts, resets, broken chunked bodies, too
+                # many redirects) counts, which also frees a half-open probe slot
+                breaker.record_failure()
+                raise
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                # Any other answer, 4xx included, shows the endpoint is up
+                breaker.record_success()
+
+            if response.status_code != 429:
+                self.rate_limiter.on_success(endpoint)
+                return response
+
+            self.rate_limiter.on_throttled(endpoint, parse_retry_after(response.headers.get("Retry-After")))
+
+        logger.warning(f"Sandbox still throttling {endpoint} after {self.throttle_retries} retries")
+        return response
+
+    def get(self, endpoint: str, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", endpoint, path, **kwargs)
+
+    def post(self, endpoint: str, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", endpoint, path, **kwargs)
+
+
+# Global instance
+sandbox_client = SandboxClient()
@@ -0,0 +1,90 @@
+"""
+Amazon SNS message verification
+Checks the signature of messages POSTed to our SNS endpoints against the
+signing certificate, which must itself be served from an SNS host, so forged
+notifications and subscription URLs are rejected before anything acts on them
+"""
+
+import base64
+import logging
+import re
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+logger = logging.getLogger(__name__)
+
+SNS_HOST_RE = re.compile(r'^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$')
+CERT_TIMEOUT = (3.05, 10)
+
+# Fields covered by the signature, in signing order
+_NOTIFICATION_FIELDS = ['Message', 'MessageId', 'Subject', 'Timestamp', 'TopicArn', 'Type']
+_SUBSCRIPTION_FIELDS = ['Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type']
+
+_certificates: Dict[str, x509.Certificate] = {}
+_certificates_lock = threading.Lock()
+
+
+def is_sns_url(url: Optional[str]) -> bool:
+    """True for https URLs on an sns.<region>.amazonaws.com host"""
+    try:
+        parsed = urlparse(url or '')
+    except ValueError:
+        return False
+    return parsed.scheme == 'https' and bool(SNS_HOST_RE.match(parsed.hostname or ''))
+
+
+def _string_to_sign(message: Dict) -> Optional[bytes]:
+    message_type = message.get('Type')
+    if message_type == 'Notification':
+        fields = _NOTIFICATION_FIELDS
+    elif message_type in ('SubscriptionConfirmation', 'UnsubscribeConfirmation'):
+        fields = _SUBSCRIPTION_FIELDS
+    else:
+        return None
+    # Optional fields (Subject) are left out entirely when absent
+    return ''.join(f"{field}\n{message[field]}\n" for field in fields if field in message).encode('utf-8')
+
+
+def _signing_certificate(url: str) -> x509.Certificate:
+    with _certificates_lock:
+        certificate = _certificates.get(url)
+    if certificate is None:
+        response = requests.get(url, timeout=CERT_TIMEOUT)
+        response.raise_for_status()
+        certificate = x509.load_pem_x509_certificate(response.content)
+        with _certificates_lock:
+            _certificates[url] = certificate
+    return certificate
+
+
+def verify_message(message: Dict) -> bool:
+    """True if the message carries a valid SNS signature"""
+    cert_url = message.get('SigningCertURL') or message.get('SigningCertUrl')
+    if not is_sns_url(cert_url):
+        logger.warning(f"SNS message with untrusted signing certificate URL: {cert_url}")
+        return False
+
+    data = _string_to_sign(message)
+    if data is None or not message.get('Signature'):
+        return False
+    algorithm = hashes.SHA256() if str(message.get('SignatureVersion')) == '2' else hashes.SHA1()
+
+    try:
+        certificate = _signing_certificate(cert_url)
+        certificate.public_key().verify(
+            base64.b64decode(message['Signature']), data, padding.PKCS1v15(), algorithm
+        )
+    except InvalidSignature:
+        logger.warning(f"SNS message {message.get('MessageId')} has an invalid signature")
+        return False
+    except Exception as e:
+        logger.error(f"Could not verify SNS message {message.get('MessageId')}: {e}")
+        return False
+    return True
@@ -0,0 +1,133 @@
+from unittest import mock
+
+import pytest
+import requests
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from sandbox_client import SandboxClient, SandboxThrottledError, SandboxUnavailableError
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return CircuitBreaker("gst", failure_threshold=3, recovery_timeout=30, half_open_probes=1)
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    stats = breaker.get_stats()
+    assert stats['trips'] == 1 and stats['rejected'] == 1
+    assert stats['retry_in_seconds'] == 30
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_recovery_timeout(breaker, clock):
+    trip(breaker)
+    clock.advance(29.9)
+    assert breaker.state == OPEN
+    clock.advance(0.1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_allows_limited_probes(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_failed_probe_reopens_for_a_full_timeout(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['trips'] == 2
+    clock.advance(29)
+    assert breaker.state == OPEN
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_release_frees_an_unused_probe_slot(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_release_while_closed_is_a_no_op(breaker):
+    breaker.release()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+@pytest.fixture
+def client(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    monkeypatch.setenv("SANDBOX_BREAKER_FAILURES", "2")
+    client = SandboxClient(base_url="https://sandbox.test", max_retries=0)
+    client._session = mock.Mock()
+    return client
+
+
+def test_client_fails_fast_while_open(client):
+    client._session.request.side_effect = requests.exceptions.ConnectionError("reset")
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.get('gst', '/gst')
+    with pytest.raises(SandboxUnavailableError):
+        client.get('gst', '/gst')
+    assert client._session.request.call_count == 2
+    assert not client.is_available('gst')
+
+
+def test_client_counts_5xx_but_not_4xx(client):
+    client._session.request.return_value = mock.Mock(status_code=404, headers={})
+    for _ in range(3):
+        client.get('gst', '/gst')
+    assert client.breaker('gst').state == CLOSED
+    client._session.request.return_value = mock.Mock(status_code=503, headers={})
+    client.get('gst', '/gst')
+    client.get('gst', '/gst')
+    assert client.breaker('gst').state == OPEN
+
+
+def test_client_releases_probe_when_no_rate_slot(client, clock):
+    client._session.request.side_effect = requests.exceptions.Timeout("slow")
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.Timeout):
+            client.get('gst', '/gst')
+    clock.advance(30)
+    with mock.patch.object(client.rate_limiter, 'acquire', return_value=False):
+        with pytest.raises(SandboxThrottledError):
+            client.get('gst', '/gst')
+    assert client.breaker('gst').allow_request()
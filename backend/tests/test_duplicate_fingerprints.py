@@ -0,0 +1,140 @@
+import io
+import threading
+import uuid
+
+import pytest
+from botocore.exceptions import ClientError
+
+import duplicate_fingerprints
+import ttl_cache
+from duplicate_fingerprints import (
+    GSTIN_AMOUNT_DATE, GSTIN_INVOICE_NUMBER, DiskFingerprintStore, FingerprintIndex, S3FingerprintStore,
+    invoice_fingerprints,
+)
+
+INVOICE = {
+    'vendor_gstin': '27AAPFU0939F1ZV',
+    'invoice_number': 'INV/2024/001',
+    'amount': '1,180.00',
+    'invoice_date': '05-03-2024',
+}
+
+
+class FakeS3:
+    """In-memory S3 with ETags and conditional puts, counting calls"""
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = {'get_object': 0, 'put_object': 0}
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket, Key):
+        self.calls['get_object'] += 1
+        with self._lock:
+            if Key not in self.objects:
+                raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+            body, etag = self.objects[Key]
+        return {'Body': io.BytesIO(body.encode('utf-8')), 'ETag': etag}
+
+    def put_object(self, Bucket, Key, Body, ContentType, IfMatch=None, IfNoneMatch=None):
+        self.calls['put_object'] += 1
+        with self._lock:
+            current = self.objects.get(Key)
+            if (IfNoneMatch == '*' and current) or (IfMatch and (current is None or current[1] != IfMatch)):
+                raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+            self.objects[Key] = (Body, uuid.uuid4().hex)
+
+
+def test_fingerprints_ignore_formatting_differences():
+    variant = {
+        'vendor_gstin': ' 27aapfu0939f1zv ',
+        'invoice_number': 'inv-2024-001',
+        'total_amount': '₹1180',
+        'invoice_date': '2024-03-05',
+    }
+    assert invoice_fingerprints(variant) == invoice_fingerprints(INVOICE)
+    assert set(invoice_fingerprints(INVOICE)) == {GSTIN_INVOICE_NUMBER, GSTIN_AMOUNT_DATE}
+
+
+def test_fingerprints_skip_missing_fields():
+    assert invoice_fingerprints(dict(INVOICE, vendor_gstin='N/A')) == {}
+    assert set(invoice_fingerprints(dict(INVOICE, amount='0'))) == {GSTIN_INVOICE_NUMBER}
+    assert set(invoice_fingerprints(dict(INVOICE, invoice_number=''))) == {GSTIN_AMOUNT_DATE}
+
+
+def test_memory_only_index_finds_added_invoices():
+    index = FingerprintIndex()
+    assert index.find(INVOICE) == {}
+    index.add(INVOICE, 'r1')
+    index.add(INVOICE, 'r1')
+    index.add(dict(INVOICE, invoice_number='OTHER-9'), 'r2')
+    assert index.find(INVOICE) == {GSTIN_INVOICE_NUMBER: ['r1'], GSTIN_AMOUNT_DATE: ['r1', 'r2']}
+    assert index.get_stats()['matches'] == 1
+
+
+@pytest.fixture
+def s3():
+    return FakeS3()
+
+
+def test_s3_lookup_is_one_get_per_fingerprint(s3):
+    FingerprintIndex(S3FingerprintStore(s3, 'bucket')).add(INVOICE, 'r1')
+    s3.calls = {'get_object': 0, 'put_object': 0}
+    matches = FingerprintIndex(S3FingerprintStore(s3, 'bucket')).find(INVOICE)
+    assert matches == {GSTIN_INVOICE_NUMBER: ['r1'], GSTIN_AMOUNT_DATE: ['r1']}
+    assert s3.calls == {'get_object': 2, 'put_object': 0}
+
+
+def test_s3_adds_from_concurrent_workers_keep_every_id(s3, monkeypatch):
+    monkeypatch.setattr(duplicate_fingerprints, 'WRITE_BACKOFF', 0.01)
+    workers = [FingerprintIndex(S3FingerprintStore(s3, 'bucket')) for _ in range(2)]
+    threads = [threading.Thread(target=workers[i % 2].add, args=(INVOICE, f"r{i}")) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    matches = FingerprintIndex(S3FingerprintStore(s3, 'bucket')).find(INVOICE)
+    assert sorted(matches[GSTIN_INVOICE_NUMBER]) == [f"r{i}" for i in range(8)]
+    assert all(worker.get_stats()['store_errors'] == 0 for worker in workers)
+
+
+def test_misses_are_cached_for_negative_ttl(s3, clock, monkeypatch):
+    monkeypatch.setattr(ttl_cache, 'time', clock)
+    index = FingerprintIndex(S3FingerprintStore(s3, 'bucket'), negative_ttl=30)
+    index.find(INVOICE)
+    index.find(INVOICE)
+    assert s3.calls['get_object'] == 2
+
+    # Another worker's add is seen once the cached miss expires
+    FingerprintIndex(S3FingerprintStore(s3, 'bucket')).add(INVOICE, 'r1')
+    assert index.find(INVOICE) == {}
+    clock.advance(30)
+    assert index.find(INVOICE)[GSTIN_INVOICE_NUMBER] == ['r1']
+
+
+def test_own_add_is_visible_immediately(s3):
+    index = FingerprintIndex(S3FingerprintStore(s3, 'bucket'))
+    assert index.find(INVOICE) == {}
+    index.add(INVOICE, 'r1')
+    assert index.find(INVOICE)[GSTIN_INVOICE_NUMBER] == ['r1']
+
+
+def test_store_write_failure_keeps_the_id_in_memory():
+    class BrokenStore:
+        def record_ids(self, digest):
+            return []
+
+        def add(self, digest, record_id):
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'PutObject')
+
+    index = FingerprintIndex(BrokenStore())
+    index.add(INVOICE, 'r1')
+    assert index.find(INVOICE)[GSTIN_INVOICE_NUMBER] == ['r1']
+    assert index.get_stats()['store_errors'] == 2
+
+
+def test_disk_store_round_trip(tmp_path):
+    store = DiskFingerprintStore(str(tmp_path))
+    FingerprintIndex(store).add(INVOICE, 'analysis/2024/03/05/a b.json')
+    matches = FingerprintIndex(DiskFingerprintStore(str(tmp_path))).find(INVOICE)
+    assert matches[GSTIN_AMOUNT_DATE] == ['analysis/2024/03/05/a b.json']
@@ -0,0 +1,63 @@
+import pytest
+
+from gstin_utils import correct_gstin_ocr, find_gstin_candidates, gstin_check_digit, validate_gstin_structure
+
+# Sample GSTINs with correct check digits
+VALID_GSTINS = ['27AAPFU0939F1ZV', '29AAGCB7383J1Z4', '33AAACH7409R1Z8']
+
+
+@pytest.mark.parametrize('gstin', VALID_GSTINS)
+def test_check_digit_matches_known_gstins(gstin):
+    assert gstin_check_digit(gstin[:14]) == gstin[14]
+    assert validate_gstin_structure(gstin) == (True, None)
+
+
+def test_check_digit_weights_alternate_positions():
+    # 1 at an odd position is doubled: "1" + 13 zeros sums to 1, "01" + 12 zeros to 2
+    assert gstin_check_digit('1' + '0' * 13) == 'Z'
+    assert gstin_check_digit('01' + '0' * 12) == 'Y'
+    # Products of 36 or more fold back: Z (35) doubled is 70 -> 1 + 34
+    assert gstin_check_digit('0Z' + '0' * 12) == '1'
+
+
+@pytest.mark.parametrize('position', range(14))
+def test_single_character_change_fails_checksum(position):
+    gstin = VALID_GSTINS[0]
+    # Same character class, so only the checksum can catch it
+    candidates = '78' if gstin[position].isdigit() else 'KM'
+    replacement = next(c for c in candidates if c != gstin[position])
+    changed = gstin[:position] + replacement + gstin[position + 1:]
+    assert not validate_gstin_structure(changed)[0]
+
+
+@pytest.mark.parametrize('body', ['99AAAGM0289C1Z', '97AAPFU0939F1Z', '27AAPFU0939F1D', '07AAACH7409R2N'])
+def test_special_state_codes_and_14th_characters_are_accepted(body):
+    assert validate_gstin_structure(body + gstin_check_digit(body)) == (True, None)
+
+
+@pytest.mark.parametrize('gstin, reason', [
+    ('27AAPFU0939F1Z', "GSTIN must be 15 characters"),
+    ('27AAPFU0939F1Z*', "GSTIN contains invalid characters"),
+    ('00AAPFU0939F1ZV', "Invalid state code 00"),
+    ('2AAAPFU0939F1ZV', "Invalid state code 2A"),
+    ('27AAPF10939F1ZV', "Embedded PAN is malformed"),
+    ('27AAPDU0939F1ZV', "Unknown PAN entity type D"),
+    ('27AAPFU0939F0ZV', "Entity number cannot be 0"),
+    ('27AAPFU0939F1ZA', "Check digit mismatch"),
+])
+def test_invalid_gstins_report_the_failed_check(gstin, reason):
+    assert validate_gstin_structure(gstin) == (False, reason)
+
+
+def test_lowercase_gstin_is_accepted():
+    assert validate_gstin_structure('27aapfu0939f1zv')[0]
+
+
+def test_ocr_confusions_are_corrected_by_position():
+    assert correct_gstin_ocr('Z7AAPFUO939F1ZV') == '27AAPFU0939F1ZV'
+    assert correct_gstin_ocr('275APFU0939F12V') == '27SAPFU0939F1ZV'
+
+
+def test_find_gstin_candidates_returns_valid_and_corrected_gstins_once():
+    text = "GSTIN: 27AAPFU0939F1ZV\nBuyer GSTIN 33AAACH74O9R1Z8\nRepeat 27AAPFU0939F1ZV\nBad 27AAPFU0939F1ZA"
+    assert find_gstin_candidates(text) == ['27AAPFU0939F1ZV', '33AAACH7409R1Z8']
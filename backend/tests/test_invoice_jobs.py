@@ -0,0 +1,98 @@
+import threading
+from contextlib import nullcontext
+
+import pytest
+
+import invoice_jobs
+from invoice_jobs import FAILED, InvoiceJobManager, SUCCEEDED
+
+
+def process(pdf, context):
+    context.report("extracting", pages=1)
+    if pdf == 'bad':
+        raise ValueError("unreadable PDF")
+    return {'pdf': pdf}
+
+
+@pytest.fixture
+def manager(clock, monkeypatch):
+    monkeypatch.setattr(invoice_jobs, 'time', clock)
+    manager = InvoiceJobManager(process, lambda result: {'data': result}, max_workers=2, retention_seconds=60)
+    yield manager
+    manager._executor.shutdown(wait=True)
+
+
+def run_job(manager, pdf, **kwargs):
+    done = threading.Event()
+    job = manager.submit(lambda: nullcontext(pdf), on_complete=lambda job: done.set(), **kwargs)
+    assert done.wait(5)
+    return job
+
+
+def test_successful_job_records_result_and_events(manager):
+    job = run_job(manager, 'invoice.pdf', source='telegram')
+    assert job.status == SUCCEEDED
+    assert job.result == {'data': {'pdf': 'invoice.pdf'}}
+    assert job.raw_result == {'pdf': 'invoice.pdf'}
+    assert [event['stage'] for event in job.events] == ['queued', 'downloading', 'extracting', 'completed']
+    assert job.events[2]['pages'] == 1
+    assert job.to_dict(include_events=False)['source'] == 'telegram'
+
+
+def test_failed_job_records_error(manager):
+    job = run_job(manager, 'bad')
+    assert job.status == FAILED
+    assert job.error == "unreadable PDF"
+    assert job.events[-1] == {'stage': 'failed', 'at': job.finished_at, 'error': "unreadable PDF"}
+    assert manager.get_stats()[FAILED] == 1
+
+
+def test_completion_callback_errors_are_contained(manager):
+    done = threading.Event()
+
+    def callback(job):
+        done.set()
+        raise RuntimeError("telegram down")
+
+    job = manager.submit(lambda: nullcontext('invoice.pdf'), on_complete=callback)
+    assert done.wait(5)
+    assert job.status == SUCCEEDED
+
+
+def test_wait_for_events_returns_new_events_only(manager):
+    job = run_job(manager, 'invoice.pdf')
+    assert [event['stage'] for event in manager.wait_for_events(job, 2, timeout=1)] == ['extracting', 'completed']
+    # Finished jobs never block
+    assert manager.wait_for_events(job, len(job.events), timeout=5) == []
+
+
+def test_finished_jobs_are_kept_for_the_retention_period(manager, clock):
+    job = run_job(manager, 'invoice.pdf')
+    clock.advance(60)
+    run_job(manager, 'other.pdf')
+    assert manager.get(job.id) is job
+
+
+def test_expired_jobs_are_purged_on_submit(manager, clock):
+    job = run_job(manager, 'invoice.pdf')
+    clock.advance(60.1)
+    newer = run_job(manager, 'other.pdf')
+    assert manager.get(job.id) is None
+    assert manager.get(newer.id) is newer
+    assert sum(manager.get_stats().values()) == 1
+
+
+def test_unfinished_jobs_are_never_purged(manager, clock):
+    release = threading.Event()
+
+    def blocked_load():
+        release.wait(5)
+        return nullcontext('slow.pdf')
+
+    slow = manager.submit(blocked_load)
+    try:
+        clock.advance(3600)
+        run_job(manager, 'other.pdf')
+        assert manager.get(slow.id) is slow
+    finally:
+        release.set()
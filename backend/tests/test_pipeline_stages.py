@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline_stages import Stage, StageTimeoutError, run_stages
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_independent_stages_run_concurrently(executor):
+    # Each stage only returns once both are running
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(name):
+        barrier.wait()
+        return name
+
+    stages = [Stage('a', meet, args=('a',)), Stage('b', meet, args=('b',))]
+    results = run_stages(stages, executor)
+    assert results['a'].value == 'a' and results['b'].value == 'b'
+
+
+def test_args_kwargs_and_dependency_results_are_passed(executor):
+    stages = [
+        Stage('total', lambda x, y=0: x + y, args=(2,), kwargs={'y': 3}),
+        Stage('doubled', lambda factor, total: total * factor, args=(2,), depends_on=['total']),
+    ]
+    results = run_stages(stages, executor)
+    assert results['doubled'].value == 10
+
+
+def test_dependent_stage_waits_for_its_dependency(executor):
+    order = []
+    stages = [
+        Stage('second', lambda first: order.append('second'), depends_on=['first']),
+        Stage('first', lambda: order.append('first')),
+    ]
+    run_stages(stages, executor)
+    assert order == ['first', 'second']
+
+
+def test_failed_dependency_is_passed_as_none(executor):
+    def fail():
+        raise RuntimeError("boom")
+
+    stages = [
+        Stage('lookup', fail),
+        Stage('score', lambda lookup: lookup, depends_on=['lookup']),
+    ]
+    results = run_stages(stages, executor)
+    assert isinstance(results['lookup'].error, RuntimeError)
+    assert not results['lookup'].ok
+    assert results['score'].ok and results['score'].value is None
+
+
+def test_slow_stage_times_out_without_holding_up_others(executor):
+    release = threading.Event()
+    stages = [
+        Stage('slow', release.wait, args=(5,), timeout=0.1),
+        Stage('fast', lambda: 'done', timeout=5),
+        Stage('after_slow', lambda slow: slow, depends_on=['slow']),
+    ]
+    try:
+        results = run_stages(stages, executor)
+    finally:
+        release.set()
+    assert isinstance(results['slow'].error, StageTimeoutError)
+    assert 0.1 <= results['slow'].elapsed < 2
+    assert results['fast'].value == 'done'
+    assert results['after_slow'].ok and results['after_slow'].value is None
+
+
+def test_on_stage_done_is_called_once_per_stage(executor):
+    done = []
+    stages = [Stage('a', lambda: 1), Stage('b', lambda a: a + 1, depends_on=['a'])]
+    run_stages(stages, executor, on_stage_done=lambda result: done.append((result.name, result.value)))
+    assert done == [('a', 1), ('b', 2)]
+
+
+def test_unknown_dependency_is_rejected(executor):
+    with pytest.raises(ValueError):
+        run_stages([Stage('a', lambda missing: None, depends_on=['missing'])], executor)
+
+
+def test_circular_dependencies_are_reported_not_run(executor):
+    calls = []
+    stages = [
+        Stage('a', lambda b: calls.append('a'), depends_on=['b']),
+        Stage('b', lambda a: calls.append('b'), depends_on=['a']),
+    ]
+    results = run_stages(stages, executor)
+    assert calls == []
+    assert all(isinstance(results[name].error, ValueError) for name in ('a', 'b'))
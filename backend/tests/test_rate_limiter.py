@@ -0,0 +1,115 @@
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+class FakeCondition:
+    """Condition whose wait() advances the fake clock instead of blocking"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self._lock.__enter__()
+
+    def __exit__(self, *exc):
+        return self._lock.__exit__(*exc)
+
+    def wait(self, timeout):
+        self.clock.advance(timeout)
+
+    def notify_all(self):
+        pass
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    limiter = AdaptiveRateLimiter(rate=2.0, burst=2.0, max_wait=10.0, min_rate=0.5, recovery_step=0.25)
+    limiter._cond = FakeCondition(clock)
+    return limiter
+
+
+def acquire_times(limiter, clock, count, endpoint='gst'):
+    times = []
+    for _ in range(count):
+        assert limiter.acquire(endpoint)
+        times.append(round(clock.now - 1_000_000.0, 6))
+    return times
+
+
+def test_burst_then_paced_at_rate(limiter, clock):
+    assert acquire_times(limiter, clock, 4) == [0, 0, 0.5, 1.0]
+
+
+def test_endpoints_have_separate_buckets(limiter, clock):
+    acquire_times(limiter, clock, 2, 'a')
+    assert acquire_times(limiter, clock, 2, 'b') == [0, 0]
+
+
+def test_gives_up_after_max_wait(limiter, clock):
+    acquire_times(limiter, clock, 2)
+    assert not limiter.acquire('gst', max_wait=0.1)
+    assert clock.now == 1_000_000.0
+    stats = limiter.get_stats()['gst']
+    assert stats['wait_timeouts'] == 1
+    assert stats['queue_depth'] == 0
+
+
+def test_throttle_halves_rate_and_pauses_for_retry_after(limiter, clock):
+    limiter.on_throttled('gst', retry_after=3)
+    assert limiter.get_stats()['gst']['rate_per_second'] == 1.0
+    assert limiter.get_stats()['gst']['paused_for_seconds'] == 3
+
+
+def test_no_burst_accrues_during_pause(limiter, clock):
+    limiter.on_throttled('gst', retry_after=3)
+    # Paced at the reduced 1/s from the end of the pause, not released together
+    assert acquire_times(limiter, clock, 3) == [4.0, 5.0, 6.0]
+
+
+def test_throttle_without_retry_after_pauses_one_interval(limiter, clock):
+    limiter.on_throttled('gst')
+    assert limiter.get_stats()['gst']['paused_for_seconds'] == 1.0
+
+
+def test_rate_never_drops_below_min_rate(limiter):
+    for _ in range(10):
+        limiter.on_throttled('gst', retry_after=0)
+    assert limiter.get_stats()['gst']['rate_per_second'] == 0.5
+
+
+def test_success_recovers_rate_in_steps(limiter):
+    limiter.on_throttled('gst', retry_after=0)
+    limiter.on_success('gst')
+    assert limiter.get_stats()['gst']['rate_per_second'] == 1.5
+    limiter.on_success('gst')
+    limiter.on_success('gst')
+    assert limiter.get_stats()['gst']['rate_per_second'] == 2.0
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('5', 5.0),
+    ('0.5', 0.5),
+    ('-3', 0.0),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    clock.now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+    later = format_datetime(datetime(2024, 1, 1, 12, 0, 30, tzinfo=timezone.utc), usegmt=True)
+    earlier = format_datetime(datetime(2024, 1, 1, 11, 0, 0, tzinfo=timezone.utc), usegmt=True)
+    assert parse_retry_after(later) == 30.0
+    assert parse_retry_after(earlier) == 0.0
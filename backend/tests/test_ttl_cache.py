@@ -0,0 +1,110 @@
+import json
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+def make_cache(clock, monkeypatch, **kwargs):
+    monkeypatch.setattr(ttl_cache, 'time', clock)
+    kwargs.setdefault('jitter', 0)
+    return TTLCache(name="test", **kwargs)
+
+
+def test_entries_expire_after_ttl(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, ttl=10)
+    cache.set('a', 1)
+    clock.advance(9.9)
+    assert cache.get('a') == 1
+    clock.advance(0.1)
+    assert cache.get('a') is None
+    assert cache.get_stats()['expired'] == 1
+
+
+def test_negative_entries_use_negative_ttl(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, ttl=100, negative_ttl=5)
+    cache.set('missing', {'error': 'not found'}, negative=True)
+    assert cache.get('missing') == {'error': 'not found'}
+    assert cache.get_stats()['negative_hits'] == 1
+    clock.advance(5)
+    assert cache.get('missing') is None
+
+
+def test_per_entry_ttl_override(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, ttl=100)
+    cache.set('short', 1, ttl=1)
+    clock.advance(1)
+    assert cache.get('short') is None
+
+
+def test_least_recently_used_entry_is_evicted(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_values_are_copied(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch)
+    value = {'ids': [1]}
+    cache.set('a', value)
+    value['ids'].append(2)
+    cache.get('a')['ids'].append(3)
+    assert cache.get('a') == {'ids': [1]}
+
+
+def test_jitter_stays_within_fraction_of_ttl(clock, monkeypatch):
+    cache = make_cache(clock, monkeypatch, ttl=100, jitter=0.1)
+    for i in range(200):
+        cache.set(str(i), i)
+    lifetimes = [entry['expires_at'] - clock.now for entry in cache._entries.values()]
+    assert all(90 <= lifetime <= 110 for lifetime in lifetimes)
+    assert len(set(lifetimes)) > 1
+
+
+def test_sets_are_batched_into_one_write(tmp_path, monkeypatch):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(name="test", persist_path=str(path), flush_interval=60, jitter=0)
+    writes = []
+    write_file = cache._write_file
+    monkeypatch.setattr(cache, '_write_file', lambda: (writes.append(1), write_file()))
+
+    for i in range(100):
+        cache.set(str(i), i)
+    assert not path.exists()
+    assert cache._flush_timer is not None
+
+    cache.flush()
+    assert len(writes) == 1
+    assert cache._flush_timer is None
+    assert len(json.loads(path.read_text())) == 100
+
+    # Nothing changed since the last write
+    cache.flush()
+    assert len(writes) == 1
+
+
+def test_flush_timer_writes_pending_changes(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(name="test", persist_path=str(path), flush_interval=0.05, jitter=0)
+    cache.set('a', 1)
+    timer = cache._flush_timer
+    timer.join(5)
+    assert json.loads(path.read_text())['a']['value'] == 1
+
+
+def test_persisted_entries_are_reloaded_unless_expired(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(ttl_cache, 'time', clock)
+    path = str(tmp_path / "cache.json")
+    cache = TTLCache(name="test", persist_path=path, ttl=10, jitter=0)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2)
+    cache.flush()
+
+    clock.advance(5)
+    reloaded = TTLCache(name="test", persist_path=path, jitter=0)
+    assert reloaded.get('long') == 2
+    assert reloaded.get('short') is None
@@ -0,0 +1,163 @@
+"""
+Bounded LRU cache with per-entry TTL
+Used in front of Sandbox lookups whose answers change rarely
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 24 * 60 * 60,
+                 negative_ttl: float = 60 * 60, jitter: float = 0.1,
+                 persist_path: Optional[str] = None, flush_interval: float = 5.0):
+        """
+        Args:
+            name: Cache name used in logs and stats
+            max_size: Maximum number of entries before the least recently used is evicted
+            ttl: Lifetime in seconds of positive entries
+            negative_ttl: Lifetime in seconds of negative ("not found"/invalid) entries
+            jitter: Fraction of the TTL randomly added or removed so entries
+                cached together don't all expire together
+            persist_path: Optional JSON file the cache is loaded from and saved to
+            flush_interval: Seconds changes are batched before the file is
+                rewritten; pending changes are also written at exit
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.jitter = jitter
+        self.persist_path = persist_path
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+        if self.persist_path:
+            self._load()
+            atexit.register(self.flush)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a copy of the cached value, or default when absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['negative_hits' if entry['negative'] else 'hits'] += 1
+            return copy.deepcopy(entry['value'])
+
+    def set(self, key: str, value: Any, negative: bool = False, ttl: Optional[float] = None):
+        """
+        Cache a value
+
+        Args:
+            negative: True for "not found"/invalid results, which use the shorter negative TTL
+            ttl: Override for this entry's lifetime in seconds
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        if self.jitter:
+            ttl *= 1 + random.uniform(-self.jitter, self.jitter)
+
+        with self._lock:
+            self._entries[key] = {
+                'value': copy.deepcopy(value),
+                'negative': negative,
+                'expires_at': time.time() + ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            if self.persist_path:
+                self._schedule_flush()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.persist_path):
+                return
+            with open(self.persist_path, 'r') as f:
+                stored = json.load(f)
+
+            now = time.time()
+            with self._lock:
+                for key, entry in stored.items():
+                    if entry.get('expires_at', 0) > now:
+                        self._entries[key] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} entries into {self.name} cache from {self.persist_path}")
+
+        except Exception as e:
+            logger.error(f"Error loading {self.name} cache from {self.persist_path}: {e}")
+
+    def _schedule_flush(self):
+        # Caller holds self._lock
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Write pending changes to the persist file"""
+        with self._lock:
+            self._flush_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._save()
+
+    def _save(self):
+        try:
+            with self._save_lock:
+                self._write_file()
+        except Exception as e:
+            logger.error(f"Error saving {self.name} cache to {self.persist_path}: {e}")
+
+    def _write_file(self):
+        with self._lock:
+            snapshot = json.dumps(self._entries)
+
+        # Write to a temp file and rename so a crash never leaves a truncated cache
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{self.name}-", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self.persist_path)
@@ -0,0 +1,146 @@
+"""
+Disk-spooled invoice uploads
+Uploads are copied to a temp file in fixed-size chunks while being hashed and
+checked for the PDF signature, so memory per request stays flat whatever the
+file size; the pipeline reads the file back or streams it to S3 as needed
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from typing import BinaryIO, Iterable
+
+import requests
+from boto3.s3.transfer import TransferConfig
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = 256 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(16 * 1024 * 1024)))
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+DOWNLOAD_TIMEOUT = (3.05, 60)
+
+# PDF readers accept the signature anywhere in the first 1KB
+PDF_SIGNATURE = b'%PDF-'
+SIGNATURE_WINDOW = 1024
+
+# Multipart above 8MB, parts streamed from the spooled file
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+
+class InvalidUploadError(ValueError):
+    """Raised when an upload is too large or isn't a PDF"""
+
+
+class SpooledUpload:
+    """A spooled upload on disk with its size and SHA-256; close() deletes the file"""
+
+    def __init__(self, path: str, size: int, sha256: str, name: str = ''):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.name = name
+
+    def open(self) -> BinaryIO:
+        return open(self.path, 'rb')
+
+    def read_bytes(self) -> bytes:
+        """Whole file in memory; only for consumers that need bytes (e.g. sync Textract)"""
+        with self.open() as f:
+            return f.read()
+
+    def upload_to_s3(self, s3_client, bucket: str, key: str):
+        """Stream the file to S3, multipart for large files"""
+        s3_client.upload_file(self.path, bucket, key, Config=S3_TRANSFER_CONFIG)
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Backstop for uploads dropped without close(), e.g. cancelled jobs
+        self.close()
+
+
+def spool_chunks(chunks: Iterable[bytes], name: str = '', max_bytes: int = None,
+                 require_pdf: bool = True) -> SpooledUpload:
+    """
+    Write chunks to a temp file, hashing and size-checking as they arrive
+
+    Raises:
+        InvalidUploadError: Over max_bytes, empty, or (with require_pdf) no PDF signature
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+
+    fd, path = tempfile.mkstemp(prefix='invoice-', suffix='.pdf', dir=SPOOL_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise InvalidUploadError(f"{name or 'Upload'} is larger than {max_bytes} bytes")
+                if len(head) < SIGNATURE_WINDOW:
+                    head += chunk[:SIGNATURE_WINDOW - len(head)]
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            raise InvalidUploadError(f"{name or 'Upload'} is empty")
+        if require_pdf and PDF_SIGNATURE not in head:
+            raise InvalidUploadError(f"{name or 'Upload'} is not a PDF file")
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest(), name)
+
+
+def _iter_stream(stream: BinaryIO) -> Iterable[bytes]:
+    while True:
+        chunk = stream.read(CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+def spool_stream(stream: BinaryIO, name: str = '', max_bytes: int = None,
+                 require_pdf: bool = True) -> SpooledUpload:
+    """Spool a file-like object (e.g. a Flask upload's stream)"""
+    return spool_chunks(_iter_stream(stream), name, max_bytes, require_pdf)
+
+
+def spool_bytes(data: bytes, name: str = '') -> SpooledUpload:
+    """Spool bytes already in memory, for callers that have them"""
+    return spool_stream(io.BytesIO(data), name, max_bytes=max(len(data), 1))
+
+
+def spool_url(url: str, name: str = '', max_bytes: int = None) -> SpooledUpload:
+    """Download a PDF straight into a spooled file"""
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as resp:
+        resp.raise_for_status()
+        declared = resp.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > (max_bytes or MAX_UPLOAD_BYTES):
+            raise InvalidUploadError(f"{name or 'Download'} is larger than {max_bytes or MAX_UPLOAD_BYTES} bytes")
+        return spool_chunks(resp.iter_content(CHUNK_BYTES), name, max_bytes)
@@ -0,0 +1,143 @@
+"""
+Known-vendor directory
+Maps vendor aliases to a canonical name and GSTIN, matched against invoice
+text in one scan with an Aho-Corasick automaton over words, so lookup cost
+doesn't grow with the number of vendors
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+import gstin_utils
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Built-in vendors; entries from VENDOR_DIRECTORY_FILE are added after these.
+# When several vendors appear in one invoice the earliest entry wins
+DEFAULT_VENDORS = [
+    {'name': 'Amazon Web Services India Private Limited', 'aliases': ['AMAZON WEB SERVICES']},
+    {'name': 'Atlys India Private Limited', 'aliases': ['ATLYS']},
+    {'name': 'United Technolink Pvt Ltd', 'aliases': ['UNITED TECHNOLINK']},
+]
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.upper())
+
+
+class _WordAutomaton:
+    """Aho-Corasick automaton whose alphabet is words rather than characters"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+    def add(self, words: List[str], value: int):
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(value)
+
+    def build(self):
+        """Compute failure links breadth-first; call after the last add()"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for word, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(word, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+                queue.append(next_state)
+
+    def iter_matches(self, words: Iterable[str]) -> Iterator[int]:
+        state = 0
+        for word in words:
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            yield from self._out[state]
+
+
+class VendorDirectory:
+    def __init__(self, vendors: List[Dict]):
+        """
+        Args:
+            vendors: Entries like {'name': ..., 'gstin': ..., 'aliases': [...]};
+                the name is always an alias too, and gstin is optional
+        """
+        self._vendors: List[Dict] = []
+        self._by_gstin: Dict[str, Dict] = {}
+        self._automaton = _WordAutomaton()
+
+        for vendor in vendors:
+            name = (vendor.get('name') or '').strip()
+            if not name:
+                logger.warning(f"Skipping vendor directory entry without a name: {vendor}")
+                continue
+            gstin = (vendor.get('gstin') or '').strip().upper() or None
+            if gstin and not gstin_utils.is_valid_gstin(gstin):
+                logger.warning(f"Vendor directory entry {name} has an invalid GSTIN {gstin}, ignoring it")
+                gstin = None
+
+            entry = {'name': name, 'gstin': gstin}
+            index = len(self._vendors)
+            self._vendors.append(entry)
+            if gstin:
+                self._by_gstin.setdefault(gstin, entry)
+            for alias in [name] + list(vendor.get('aliases') or []):
+                words = _words(alias)
+                if words:
+                    self._automaton.add(words, index)
+
+        self._automaton.build()
+
+    @classmethod
+    def from_file(cls, path: Optional[str], base: List[Dict] = DEFAULT_VENDORS) -> "VendorDirectory":
+        """Directory of the base vendors plus those in the JSON list at path, if any"""
+        vendors = list(base)
+        if path:
+            try:
+                with open(path, 'r') as f:
+                    vendors.extend(json.load(f))
+                logger.info(f"Loaded vendor directory from {path}")
+            except Exception as e:
+                logger.error(f"Error loading vendor directory from {path}: {e}")
+        return cls(vendors)
+
+    def match(self, text: str) -> Optional[Dict]:
+        """The earliest-listed vendor with an alias appearing as whole words in the text"""
+        best = None
+        for index in self._automaton.iter_matches(_words(text)):
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return dict(self._vendors[best]) if best is not None else None
+
+    def lookup_gstin(self, gstin: str) -> Optional[Dict]:
+        entry = self._by_gstin.get((gstin or '').upper())
+        return dict(entry) if entry else None
+
+    def __len__(self) -> int:
+        return len(self._vendors)
+
+
+vendor_directory = VendorDirectory.from_file(os.getenv("VENDOR_DIRECTORY_FILE"))